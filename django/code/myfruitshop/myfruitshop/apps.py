@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class MyfruitshopConfig(AppConfig):
+    name = 'myfruitshop'
+
+    def ready(self) -> None:
+        # ユーザーキャッシュの無効化シグナルを登録する
+        from . import auth  # noqa: F401
@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myfruitshop.settings')
 
 application = get_asgi_application()
+
+# サーバープロセスでのみキャッシュのウォームアップを開始する（/healthz/ready は完了後に200を返す）
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP_ON_STARTUP:
+    from sales.warmup import start_warmup
+
+    start_warmup()
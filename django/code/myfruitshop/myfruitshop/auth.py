@@ -0,0 +1,90 @@
+import logging
+from typing import Union
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AbstractBaseUser, AnonymousUser
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpRequest
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+
+logger = logging.getLogger(__name__)
+
+
+def user_cache_key(user_id: Union[int, str]) -> str:
+    return f'auth:user:{user_id}'
+
+
+def invalidate_cached_user(user_id: Union[int, str]) -> None:
+    cache.delete(user_cache_key(user_id))
+
+
+def cache_is_shared() -> bool:
+    """既定のキャッシュが全プロセスで共有されているか（プロセス内のLocMemCacheでないか）。"""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def get_cached_user(request: HttpRequest) -> Union[AbstractBaseUser, AnonymousUser]:
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = _load_user(request)
+    return request._cached_user
+
+
+def _load_user(request: HttpRequest) -> Union[AbstractBaseUser, AnonymousUser]:
+    try:
+        user_id: str = request.session[SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+
+    user = cache.get(user_cache_key(user_id))
+    if user is not None and request.session.get(BACKEND_SESSION_KEY) in settings.AUTHENTICATION_BACKENDS:
+        # パスワード変更後のセッションはDjango標準と同じくハッシュの不一致で無効になる
+        session_hash = request.session.get(HASH_SESSION_KEY)
+        if session_hash and constant_time_compare(session_hash, user.get_session_auth_hash()):
+            return user
+
+    # キャッシュに無い、または検証できない場合はDjango標準の処理（DB参照・セッション破棄）に任せる
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(user_cache_key(user.pk), user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """request.user をキャッシュから読み込み、ページごとの auth_user の SELECT を省く。
+
+    キャッシュがプロセス内にしか無い場合、ログアウトやパスワード変更で破棄されるのは処理したプロセスの
+    キャッシュだけになる。DEBUG（開発サーバー）以外ではキャッシュを使わず、Django標準の処理を行う。
+    """
+
+    def __init__(self, get_response) -> None:
+        super().__init__(get_response)
+        self.use_cache: bool = settings.DEBUG or cache_is_shared()
+        if not self.use_cache:
+            logger.warning('User cache is disabled: the default cache is not shared between processes')
+
+    def process_request(self, request: HttpRequest) -> None:
+        super().process_request(request)
+        if self.use_cache:
+            request.user = SimpleLazyObject(lambda: get_cached_user(request))
+
+
+@receiver(user_logged_out)
+def invalidate_on_logout(sender, request, user, **kwargs) -> None:
+    if user is not None:
+        invalidate_cached_user(user.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_on_user_change(sender, instance, **kwargs) -> None:
+    # パスワード変更・権限変更・last_login更新などで保存されたら破棄する
+    invalidate_cached_user(instance.pk)
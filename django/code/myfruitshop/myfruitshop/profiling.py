@@ -0,0 +1,178 @@
+import cProfile
+import itertools
+import json
+import logging
+import os
+import pstats
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILING: Dict[str, Any] = {
+    'ENABLED': False,
+    'QUERY_PARAM': 'profile',
+    'HEADER': 'X-Profile',
+    'SAMPLE_RATE': 0,
+    'DIRECTORY': os.path.join(settings.BASE_DIR, 'profiles'),
+    'MAX_PROFILES': 50,
+    'SLOWEST_QUERIES': 20,
+}
+
+
+def get_profiling_config() -> Dict[str, Any]:
+    return {**DEFAULT_PROFILING, **getattr(settings, 'PROFILING', {})}
+
+
+class ProfileStore:
+    """プロファイル結果をディスクに保存する。件数を超えた古いものから削除する。"""
+
+    def __init__(self, directory: str, max_profiles: int) -> None:
+        self.directory: str = directory
+        self.max_profiles: int = max_profiles
+
+    def save(self, request: HttpRequest, profiler: cProfile.Profile,
+             queries: List[Dict[str, Any]], duration: float, slowest: int) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        name: str = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        profiler.dump_stats(self._path(name, '.prof'))
+
+        meta: Dict[str, Any] = {
+            'name': name,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'duration': duration,
+            'query_count': len(queries),
+            'query_time': sum(query['duration'] for query in queries),
+            'slowest_queries': sorted(
+                queries, key=lambda query: query['duration'], reverse=True)[:slowest],
+        }
+        with open(self._path(name, '.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        self._trim()
+        return name
+
+    def names(self) -> List[str]:
+        """新しい順にプロファイル名を返す。"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            (filename[:-len('.json')] for filename in os.listdir(self.directory)
+             if filename.endswith('.json')),
+            reverse=True,
+        )
+
+    def load(self, name: str) -> Optional[Dict[str, Any]]:
+        if name not in self.names():
+            return None
+        try:
+            with open(self._path(name, '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def top_functions(self, name: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """累積時間の大きい関数を返す。"""
+        if name not in self.names():
+            return []
+        stats: pstats.Stats = pstats.Stats(self._path(name, '.prof'))
+        stats.sort_stats(pstats.SortKey.CUMULATIVE)
+
+        functions: List[Dict[str, Any]] = []
+        for func in stats.fcn_list[:limit]:
+            primitive_calls, calls, total_time, cumulative_time, _ = stats.stats[func]
+            functions.append({
+                'function': pstats.func_std_string(func),
+                'calls': calls,
+                'total_time': total_time,
+                'cumulative_time': cumulative_time,
+            })
+        return functions
+
+    def _path(self, name: str, suffix: str) -> str:
+        return os.path.join(self.directory, name + suffix)
+
+    def _trim(self) -> None:
+        for name in self.names()[self.max_profiles:]:
+            for suffix in ('.json', '.prof'):
+                try:
+                    os.remove(self._path(name, suffix))
+                except FileNotFoundError:
+                    # 並行リクエストで既に削除済み
+                    pass
+
+
+class ProfilingMiddleware:
+    """スタッフが明示的に指定したリクエスト、またはN件に1件のリクエストをcProfileで計測する。
+
+    無効時はMiddlewareNotUsedで読み込み自体を行わないため、通常のリクエストにコストはかからない。
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.config: Dict[str, Any] = get_profiling_config()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        self.store: ProfileStore = ProfileStore(
+            self.config['DIRECTORY'], self.config['MAX_PROFILES'])
+        self.header: str = 'HTTP_' + self.config['HEADER'].upper().replace('-', '_')
+        self.counter: itertools.count = itertools.count(1)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        return self.get_response(request)
+
+    def process_view(self, request: HttpRequest, view_func: Callable, view_args: tuple,
+                     view_kwargs: Dict[str, Any]) -> Optional[HttpResponse]:
+        if not self._should_profile(request):
+            return None
+
+        queries: List[Dict[str, Any]] = []
+
+        def record_query(execute, sql, params, many, context):
+            start: float = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append({'sql': sql, 'duration': time.perf_counter() - start})
+
+        def call_view() -> HttpResponse:
+            response: HttpResponse = view_func(request, *view_args, **view_kwargs)
+            # TemplateResponseの描画も計測に含める
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            return response
+
+        profiler: cProfile.Profile = cProfile.Profile()
+        start: float = time.perf_counter()
+        with connection.execute_wrapper(record_query):
+            response: HttpResponse = profiler.runcall(call_view)
+        duration: float = time.perf_counter() - start
+
+        try:
+            name: str = self.store.save(
+                request, profiler, queries, duration, self.config['SLOWEST_QUERIES'])
+            logger.info('Stored profile %s for %s (%.3fs)', name, request.path, duration)
+        except OSError:
+            logger.exception('Failed to store profile for %s', request.path)
+
+        return response
+
+    def _should_profile(self, request: HttpRequest) -> bool:
+        sample_rate: int = self.config['SAMPLE_RATE']
+        if sample_rate and next(self.counter) % sample_rate == 0:
+            return True
+
+        requested: bool = (
+            self.config['QUERY_PARAM'] in request.GET or self.header in request.META
+        )
+        # 明示的な指定はスタッフのみ有効
+        return requested and request.user.is_staff
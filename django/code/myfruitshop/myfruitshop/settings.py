@@ -26,9 +26,10 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myfruitshop.auth.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'myfruitshop.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'myfruitshop.urls'
@@ -37,8 +38,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # テンプレートの解析結果をプロセス内に保持する
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -62,6 +69,37 @@ DATABASES = {
     }
 }
 
+# 販売一覧の行・集計表のフラグメントキャッシュ、集計結果・セッション・ログイン中ユーザーのキャッシュに使用する。
+# REDIS_URL を指定した場合はプロセス間で共有するRedisを使う。未指定時のプロセス内キャッシュは、
+# ログアウトやパスワード変更を他のプロセスに伝えられないため、開発サーバー（1プロセス）向け
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'myfruitshop',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+SALES_AGGREGATE_CACHE_TIMEOUT = 60 * 60
+
+# 共有キャッシュがある場合、セッションはキャッシュから読み、DBは書き込み時とキャッシュミス時のみ参照する。
+# プロセス内キャッシュでは他のプロセスでのログアウトが反映されないため、DEBUG以外ではDBのセッションを使う
+if REDIS_URL or DEBUG:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# ログイン中ユーザーのキャッシュ時間（ログアウト・ユーザー保存時は即時に破棄）
+AUTH_USER_CACHE_TIMEOUT = 5 * 60
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -86,6 +124,32 @@ LOGIN_REDIRECT_URL = '/'
 LOGIN_URL = '/accounts/login/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
 
+# CSV一括取込: このサイズ以上のアップロードはプロセスプールで並列に解析する
+SALES_IMPORT_WORKERS = int(os.environ.get('SALES_IMPORT_WORKERS', os.cpu_count() or 1))
+SALES_IMPORT_PARALLEL_THRESHOLD = 8 * 1024 * 1024
+
+# 販売登録のグループコミット。同時に届いた登録を最大MAX_ROWS件・MAX_DELAY_MSミリ秒まとめて1回でコミットする
+SALES_GROUP_COMMIT = {
+    'ENABLED': os.environ.get('SALES_GROUP_COMMIT_ENABLED', '0') == '1',
+    'MAX_ROWS': 100,
+    'MAX_DELAY_MS': 10,
+    'SUBMIT_TIMEOUT': 30.0,
+}
+
+# サーバー起動時（WSGI/ASGIアプリケーション読み込み時）にキャッシュを温める
+WARMUP_ON_STARTUP = os.environ.get('WARMUP_ON_STARTUP', '1') == '1'
+
+# リクエストプロファイリング（無効時はミドルウェアが読み込まれない）
+# ?profile または X-Profile ヘッダー（スタッフのみ）、もしくは SAMPLE_RATE 件に1件を計測する
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED', '0') == '1',
+    'QUERY_PARAM': 'profile',
+    'HEADER': 'X-Profile',
+    'SAMPLE_RATE': int(os.environ.get('PROFILING_SAMPLE_RATE', '0')),
+    'DIRECTORY': os.path.join(BASE_DIR, 'profiles'),
+    'MAX_PROFILES': 50,
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -2,18 +2,21 @@ from django import template
 
 register = template.Library()
 
+# 集計表の値はビューで整形済みの文字列として渡される。
+# 文字列はそのまま返し、整形前の値が渡された場合のみ組み立てる。
+
 @register.filter(name='format_md_tuple')
 def format_md_tuple(md_tuple):
-    if isinstance(md_tuple, tuple) and len(md_tuple) == 2:
-        year, month = md_tuple
-        return f"{year}/{month}"
-    else:
-        year, month, day = md_tuple
-        return f"{year}/{month}/{day}"
+    if isinstance(md_tuple, str):
+        return md_tuple
+    # (year, month) または (year, month, day)
+    return '/'.join(str(part) for part in md_tuple)
 
 @register.filter(name='format_sales_data')
 def format_sales_data(sales_data):
-    formatted_data = []
-    for fruit, details in sales_data.items():
-        formatted_data.append(f"{fruit}: {details['amount']}円 ({details['quantity']})")
-    return '   '.join(formatted_data)
+    if isinstance(sales_data, str):
+        return sales_data
+    return '   '.join(
+        f"{fruit}: {details['amount']}円 ({details['quantity']})"
+        for fruit, details in sales_data.items()
+    )
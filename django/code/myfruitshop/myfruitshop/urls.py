@@ -1,11 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth.views import LoginView, LogoutView
-from .views import TopPageView
+from .views import ProfileListView, ReadinessView, TopPageView
 
 urlpatterns = [
+    path('admin/profiles/', admin.site.admin_view(ProfileListView.as_view()), name='profiles'),
     path('admin/', admin.site.urls),
     path('top/', TopPageView.as_view(), name='top'),
+    path('healthz/ready', ReadinessView.as_view(), name='readiness'),
     path('accounts/login/', LoginView.as_view(next_page='top'), name='login'),
     path('accounts/logout/', LogoutView.as_view(), name='logout'),
     path('sales/', include('sales.urls')),
@@ -1,10 +1,59 @@
+from typing import Any, Dict, List, Optional
+
 from django.shortcuts import render
+from django.contrib import admin
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views import View
-from django.http import HttpRequest, HttpResponse
+from django.db import DatabaseError, connection
+from django.http import HttpRequest, HttpResponse, JsonResponse
+
+from sales.warmup import is_warmed_up
+
+from .profiling import ProfileStore, get_profiling_config
 
 class TopPageView(LoginRequiredMixin, View):
     template_name: str = 'top.html'
 
     def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
         return render(request, self.template_name)
+
+
+class ProfileListView(View):
+    """保存済みプロファイルの一覧と、選択したプロファイルの詳細を表示する（管理画面用）。"""
+
+    template_name: str = 'admin/profile_list.html'
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        config: Dict[str, Any] = get_profiling_config()
+        store: ProfileStore = ProfileStore(config['DIRECTORY'], config['MAX_PROFILES'])
+        names: List[str] = store.names()
+        profiles: List[Dict[str, Any]] = [
+            profile for profile in (store.load(name) for name in names) if profile
+        ]
+
+        selected_name: str = request.GET.get('name') or (names[0] if names else '')
+        selected: Optional[Dict[str, Any]] = store.load(selected_name) if selected_name else None
+
+        context: Dict[str, Any] = {
+            **admin.site.each_context(request),
+            'title': 'Request profiles',
+            'enabled': config['ENABLED'],
+            'profiles': profiles,
+            'selected': selected,
+            'top_functions': store.top_functions(selected_name) if selected else [],
+        }
+        return render(request, self.template_name, context)
+
+
+class ReadinessView(View):
+    """ウォームアップが完了し、DBに接続できる場合のみ200を返す（ロードバランサー用）。"""
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if not is_warmed_up():
+            return JsonResponse({'status': 'warming_up'}, status=503)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except DatabaseError:
+            return JsonResponse({'status': 'database_unavailable'}, status=503)
+        return JsonResponse({'status': 'ready'})
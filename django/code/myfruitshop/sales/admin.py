@@ -1,3 +1,103 @@
+from typing import Any, Dict
+
 from django.contrib import admin
+from django.db import models, transaction
+from django.http import HttpRequest
+from django.utils import timezone
+
+from .cache import bump_sales_generation, invalidate_fruit_catalog
+from .models import Fruit, FruitPriceHistory, Sale
+
+# 一括操作で1トランザクションあたりに更新する行数
+ACTION_CHUNK_SIZE: int = 1000
+
+
+def update_in_chunks(queryset: models.QuerySet, **values: Any) -> int:
+    """主キー順にチャンク分割して更新し、長時間のロックを避ける。"""
+    model = queryset.model
+    pk_queryset: models.QuerySet = queryset.order_by('pk').values_list('pk', flat=True)
+    values.setdefault('updated_at', timezone.now())
+    updated: int = 0
+    last_pk: int = 0
+
+    while True:
+        pks: list = list(pk_queryset.filter(pk__gt=last_pk)[:ACTION_CHUNK_SIZE])
+        if not pks:
+            # update()ではシグナルが発生しないため、ここでキャッシュを無効化する
+            bump_sales_generation()
+            if model is Fruit:
+                invalidate_fruit_catalog()
+            return updated
+        with transaction.atomic():
+            updated += model.objects.filter(pk__in=pks).update(**values)
+        last_pk = pks[-1]
+
+
+class SoftDeleteAdminMixin:
+    """論理削除・復元のアクションを提供し、物理削除の一括アクションを外す。"""
+
+    actions = ['soft_delete', 'restore']
+
+    def get_actions(self, request: HttpRequest) -> Dict[str, Any]:
+        actions: Dict[str, Any] = super().get_actions(request)
+        # 標準の一括削除は全件をメモリに読み込むため使用しない
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='選択した行を削除（論理削除）')
+    def soft_delete(self, request: HttpRequest, queryset: models.QuerySet) -> None:
+        updated: int = update_in_chunks(queryset, is_active=False)
+        self.message_user(request, f'{updated}件を削除しました。')
+
+    @admin.action(description='選択した行を復元')
+    def restore(self, request: HttpRequest, queryset: models.QuerySet) -> None:
+        updated: int = update_in_chunks(queryset, is_active=True)
+        self.message_user(request, f'{updated}件を復元しました。')
+
+
+class FruitPriceHistoryInline(admin.TabularInline):
+    # 導入前の期間の単価など、過去の日付から有効な単価を登録する
+    model = FruitPriceHistory
+    fields = ('price', 'valid_from', 'created_at')
+    readonly_fields = ('created_at',)
+    ordering = ('-valid_from',)
+    extra = 1
+
+
+@admin.register(Fruit)
+class FruitAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'name', 'price', 'is_active', 'updated_at')
+    list_filter = ('is_active',)
+    # 前方一致にしてnameのインデックスを使う
+    search_fields = ('^name',)
+    ordering = ('name',)
+    readonly_fields = ('created_at', 'updated_at')
+    show_full_result_count = False
+    inlines = (FruitPriceHistoryInline,)
+
+
+@admin.register(FruitPriceHistory)
+class FruitPriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'fruit', 'price', 'valid_from', 'created_at')
+    list_select_related = ('fruit',)
+    autocomplete_fields = ('fruit',)
+    # 果物名の前方一致（Fruit.nameのインデックスを使う）
+    search_fields = ('^fruit__name',)
+    date_hierarchy = 'valid_from'
+    ordering = ('fruit__name', '-valid_from')
+    readonly_fields = ('created_at',)
+    show_full_result_count = False
+
 
-# Register your models here.
+@admin.register(Sale)
+class SaleAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'fruit', 'quantity', 'total_amount', 'sale_date', 'is_active')
+    list_filter = ('is_active',)
+    list_select_related = ('fruit',)
+    # 果物はプルダウンに全件展開せず、検索で選択する
+    autocomplete_fields = ('fruit',)
+    # 日付階層はタイムゾーン変換が不要な日付の列で絞り込む（sale_local_date の範囲検索）
+    date_hierarchy = 'sale_local_date'
+    ordering = ('-sale_date',)
+    readonly_fields = ('import_fingerprint', 'created_at', 'updated_at')
+    show_full_result_count = False
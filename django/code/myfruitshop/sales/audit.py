@@ -0,0 +1,223 @@
+"""販売データの整合性チェック（manage.py audit_sales）。
+
+販売IDの範囲ごとに、有効な販売について次を検証する。
+
+- 売上金額が「個数 × 販売日時点の単価」と一致するか
+- sale_local_date / sale_year_month が sale_date から求めた日付・年月と一致するか
+- 販売統計画面の累計・月別・日別の集計値が、sale_date から求めた期間ごとの行の合計と一致するか
+
+監査中に登録・編集・削除された販売は、画面の集計値と行の合計のどちらかにしか反映されないため、
+監査の開始後に更新された販売は検証から除き、その件数を数える。
+
+ワーカーはDjangoの初期化前にこのモジュールを読み込むため、モデルは関数内で読み込む。
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import django
+
+from .pricing import PriceIndex
+from .process_pool import map_in_pool
+
+# 1タスクで検証する販売IDの幅
+AUDIT_RANGE_SIZE: int = 100000
+# DBから読み出す1回あたりの行数
+AUDIT_FETCH_SIZE: int = 5000
+# 修正時に1回のbulk_updateで更新する行数
+AUDIT_FIX_CHUNK_SIZE: int = 1000
+
+# (販売ID, 売上金額, 販売日時点の単価での売上金額（単価が不明な場合はNone）, 修正可能か)
+# 実際に記録された価格履歴の期間の販売だけを修正可能とする。価格履歴の導入前の販売は、
+# 導入時の推定（登録日時から現在の単価）と比べているだけのため、報告のみとし書き換えない
+Mismatch = Tuple[int, int, Optional[int], bool]
+# (販売ID, 保存されている (日付, 年月), sale_dateから求めた (日付, 年月))
+CalendarMismatch = Tuple[int, Tuple[date, int], Tuple[date, int]]
+# (期間のキー, 果物ID) -> [売上合計, 個数]。期間のキーは販売統計画面と同じ (年, 月) / (年, 月, 日)
+Buckets = Dict[Tuple[Tuple[int, ...], int], List[int]]
+# (集計の名前, 画面の値, 行から求めた値)
+RollupMismatch = Tuple[str, str, str]
+
+
+@dataclass
+class AggregateWindow:
+    """販売統計画面（SalesAggregateView）の月別・日別の集計期間。"""
+
+    first_month: int
+    first_day: date
+    today: date
+
+    @classmethod
+    def from_view(cls, view: Any) -> 'AggregateWindow':
+        return cls(
+            view.start_date_monthly.year * 100 + view.start_date_monthly.month,
+            view.start_date_daily.date(),
+            view.today,
+        )
+
+
+@dataclass
+class RangeResult:
+    """販売IDの範囲 [start, end) の検証結果。"""
+
+    start: int
+    end: int
+    # 有効な販売の件数・売上合計と、正しい金額での売上合計
+    count: int = 0
+    amount: int = 0
+    expected_amount: int = 0
+    mismatches: List[Mismatch] = field(default_factory=list)
+    calendar_mismatches: List[CalendarMismatch] = field(default_factory=list)
+    # sale_dateから求めた期間ごとの行の合計
+    monthly: Buckets = field(default_factory=dict)
+    daily: Buckets = field(default_factory=dict)
+    # 監査の開始後に更新（編集・削除を含む）された販売の件数
+    changed: int = 0
+    fixed: int = 0
+    calendar_fixed: int = 0
+
+
+def iter_id_ranges(first_id: int, last_id: int, range_size: int = AUDIT_RANGE_SIZE) -> Iterator[Tuple[int, int]]:
+    """first_id から last_id までを含む、幅 range_size の半開区間を返す。"""
+    for start in range(first_id, last_id + 1, range_size):
+        yield start, min(start + range_size, last_id + 1)
+
+
+class SaleAuditor:
+    """販売IDの範囲を検証し、fix=True なら修正可能な売上金額と日付・年月を正しい値に更新する。"""
+
+    def __init__(self, price_index: PriceIndex, window: AggregateWindow, started_at: datetime,
+                 fix: bool = False) -> None:
+        self.price_index: PriceIndex = price_index
+        self.window: AggregateWindow = window
+        # 監査の開始日時（画面の集計値を取得する前）
+        self.started_at: datetime = started_at
+        self.fix: bool = fix
+
+    def audit_range(self, start: int, end: int) -> RangeResult:
+        from django.db.models import Q
+
+        from .models import Sale, local_calendar_keys
+
+        result: RangeResult = RangeResult(start, end)
+        # 監査中に削除された販売も数えるため、開始後に更新された無効な販売も読み出す
+        rows = Sale.objects.filter(
+            Q(is_active=True) | Q(updated_at__gt=self.started_at), pk__gte=start, pk__lt=end,
+        ).order_by('pk').values_list(
+            'pk', 'fruit_id', 'quantity', 'total_amount', 'sale_date', 'sale_local_date', 'sale_year_month',
+            'updated_at',
+        ).iterator(chunk_size=AUDIT_FETCH_SIZE)
+        for pk, fruit_id, quantity, total_amount, sale_date, local_date, year_month, updated_at in rows:
+            if updated_at > self.started_at:
+                result.changed += 1
+                continue
+            price: Optional[int] = self.price_index.price_at(fruit_id, sale_date)
+            expected: Optional[int] = None if price is None else quantity * price
+            fixable: bool = self.price_index.recorded_price_at(fruit_id, sale_date) is not None
+            result.count += 1
+            result.amount += total_amount
+            result.expected_amount += total_amount if expected is None else expected
+            if expected != total_amount:
+                result.mismatches.append((pk, total_amount, expected, fixable))
+
+            keys: Tuple[date, int] = local_calendar_keys(sale_date)
+            if (local_date, year_month) != keys:
+                result.calendar_mismatches.append((pk, (local_date, year_month), keys))
+            self.add_to_buckets(result, fruit_id, quantity, total_amount, *keys)
+
+        if self.fix:
+            result.fixed = self.fix_mismatches(result.mismatches)
+            result.calendar_fixed = self.fix_calendar_mismatches(result.calendar_mismatches)
+        return result
+
+    def add_to_buckets(self, result: RangeResult, fruit_id: int, quantity: int, amount: int,
+                       local_date: date, year_month: int) -> None:
+        # 販売統計画面と同じく、当日より後の販売は含めない
+        if local_date > self.window.today:
+            return
+        buckets: List[Tuple[Buckets, Tuple[int, ...]]] = []
+        if year_month >= self.window.first_month:
+            buckets.append((result.monthly, divmod(year_month, 100)))
+        if local_date >= self.window.first_day:
+            buckets.append((result.daily, (local_date.year, local_date.month, local_date.day)))
+        for bucket, key in buckets:
+            totals: List[int] = bucket.setdefault((key, fruit_id), [0, 0])
+            totals[0] += amount
+            totals[1] += quantity
+
+    def fix_mismatches(self, mismatches: List[Mismatch]) -> int:
+        from django.utils import timezone
+
+        from .models import Sale
+
+        now = timezone.now()
+        return self._bulk_update([
+            Sale(pk=pk, total_amount=expected, updated_at=now)
+            for pk, _, expected, fixable in mismatches if fixable
+        ], ['total_amount', 'updated_at'])
+
+    def fix_calendar_mismatches(self, mismatches: List[CalendarMismatch]) -> int:
+        from .models import Sale
+
+        return self._bulk_update([
+            Sale(pk=pk, sale_local_date=local_date, sale_year_month=year_month)
+            for pk, _, (local_date, year_month) in mismatches
+        ], ['sale_local_date', 'sale_year_month'])
+
+    def _bulk_update(self, sales: List[Any], fields: List[str]) -> int:
+        from django.db import transaction
+
+        from .models import Sale
+
+        for start in range(0, len(sales), AUDIT_FIX_CHUNK_SIZE):
+            with transaction.atomic():
+                Sale.objects.bulk_update(sales[start:start + AUDIT_FIX_CHUNK_SIZE], fields)
+        return len(sales)
+
+
+def merge_buckets(target: Buckets, source: Buckets) -> None:
+    for key, (amount, quantity) in source.items():
+        totals: List[int] = target.setdefault(key, [0, 0])
+        totals[0] += amount
+        totals[1] += quantity
+
+
+def compare_rollups(served: Dict[str, Any], amount: int, monthly: Buckets, daily: Buckets,
+                    fruit_names: Dict[int, str]) -> List[RollupMismatch]:
+    """販売統計画面の集計値（SalesAggregateView.aggregate_buckets()）を、行から求めた値と比べる。"""
+    mismatches: List[RollupMismatch] = []
+    if served['total_sales'] != amount:
+        mismatches.append(('total', str(served['total_sales']), str(amount)))
+
+    for name, served_data, raw in (('monthly', served['monthly_data'], monthly),
+                                   ('daily', served['daily_data'], daily)):
+        # 画面と同じく、期間ごとに果物名で内訳をまとめる
+        raw_details: Dict[Tuple[int, ...], Dict[str, Tuple[int, int]]] = defaultdict(dict)
+        for (key, fruit_id), (fruit_amount, quantity) in raw.items():
+            fruit_name: str = fruit_names[fruit_id]
+            previous: Tuple[int, int] = raw_details[key].get(fruit_name, (0, 0))
+            raw_details[key][fruit_name] = (previous[0] + fruit_amount, previous[1] + quantity)
+        served_details: Dict[Tuple[int, ...], Dict[str, Tuple[int, int]]] = {
+            key: {fruit: (detail['amount'], detail['quantity']) for fruit, detail in bucket['details'].items()}
+            for key, bucket in served_data
+        }
+        for key in sorted(set(served_details) | set(raw_details)):
+            if served_details.get(key, {}) != raw_details.get(key, {}):
+                label: str = f'{name} {"/".join(str(part) for part in key)}'
+                mismatches.append((label, repr(served_details.get(key, {})), repr(raw_details.get(key, {}))))
+    return mismatches
+
+
+def _audit_range(auditor: SaleAuditor, id_range: Tuple[int, int]) -> RangeResult:
+    return auditor.audit_range(*id_range)
+
+
+def audit_in_pool(id_ranges: Iterable[Tuple[int, int]], auditor: SaleAuditor,
+                  workers: int) -> Iterator[RangeResult]:
+    """範囲をプロセスプールで検証し、入力と同じ順序で結果を返す。
+
+    ワーカーはdjango.setup()を呼んでから検証し、DB接続はワーカーごとに1本となる
+    （DJANGO_SETTINGS_MODULE は親プロセスの環境変数を引き継ぐ）。
+    """
+    return map_in_pool(_audit_range, id_ranges, auditor, workers, setup=django.setup)
@@ -0,0 +1,42 @@
+import time
+from operator import itemgetter
+from typing import Any, Dict, List
+
+from django.core.cache import cache
+
+from .models import Fruit
+
+# 販売データの世代番号。販売・果物が変更されるたびに進め、集計結果のキャッシュを無効化する
+SALES_GENERATION_KEY: str = 'sales:generation'
+# 有効な果物の一覧（名前順）。果物が変更されたら破棄する
+FRUIT_CATALOG_KEY: str = 'fruit:catalog'
+
+
+def sales_generation() -> int:
+    # 追い出し後に過去の番号を再利用しないよう、初期値は現在時刻から作る
+    return cache.get_or_set(SALES_GENERATION_KEY, time.time_ns, timeout=None)
+
+
+def bump_sales_generation() -> None:
+    """集計キャッシュを無効化する。シグナルが発生しない一括更新（bulk_create/update）の後にも呼ぶ。"""
+    try:
+        cache.incr(SALES_GENERATION_KEY)
+    except ValueError:
+        # キーが未作成または追い出し済み
+        cache.set(SALES_GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def fruit_catalog() -> List[Dict[str, Any]]:
+    catalog = cache.get(FRUIT_CATALOG_KEY)
+    if catalog is None:
+        # 二分探索に使うため、DBの照合順序ではなくPythonの文字列順で並べる
+        catalog = sorted(
+            Fruit.objects.filter(is_active=True).values('id', 'name', 'price'),
+            key=itemgetter('name'),
+        )
+        cache.set(FRUIT_CATALOG_KEY, catalog, timeout=None)
+    return catalog
+
+
+def invalidate_fruit_catalog() -> None:
+    cache.delete(FRUIT_CATALOG_KEY)
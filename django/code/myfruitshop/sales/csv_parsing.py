@@ -0,0 +1,148 @@
+"""CSV行の解析と検証。
+
+プロセスプールのワーカーからも読み込まれるため、Django（モデルやDB接続）には依存しない。
+"""
+import csv
+import hashlib
+from datetime import datetime, tzinfo
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from .pricing import PriceIndex
+from .process_pool import map_in_pool
+
+SALE_DATE_FORMAT: str = "%Y-%m-%d %H:%M"
+# ワーカーに渡す1チャンクあたりの行数
+PARSE_CHUNK_LINES: int = 20000
+
+# (果物名, 個数, 売上金額, 販売日時（タイムゾーン付き）, フィンガープリント)
+ParsedRow = Tuple[str, int, int, datetime, str]
+# (検証済みの行, 不正な行数)
+ParsedChunk = Tuple[List[ParsedRow], int]
+
+
+def sale_fingerprint(fruit_name: str, quantity: int, total_amount: int, sale_date: str, source: str) -> str:
+    """販売1行を一意に識別するハッシュ値を返す。"""
+    payload: str = '\x1f'.join(
+        [fruit_name, str(quantity), str(total_amount), sale_date, source])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def occurrence_fingerprint(fingerprint: str, occurrence: int) -> str:
+    """同じファイル内で同じ内容の行が何回目に現れたか（0始まり）を含めたフィンガープリントを返す。
+
+    別々のレジで同じ時刻に同じ販売があった場合も別の販売として登録し、再アップロード時は同じ値になる。
+    1回目は内容だけのフィンガープリントのままとし、以前に取り込んだ行とも一致させる。
+    """
+    if occurrence == 0:
+        return fingerprint
+    return hashlib.sha256(f'{fingerprint}\x1f{occurrence}'.encode('utf-8')).hexdigest()
+
+
+class RowValidator:
+    """CSVの1行を検証する。単価は販売日時時点の価格履歴から求める。
+
+    プロセスプールのワーカーへ一度だけ渡せるよう、保持するのはpickle可能な値のみ。
+    """
+
+    def __init__(self, fruit_ids: Dict[str, int], price_index: PriceIndex,
+                 tz: tzinfo, source: str) -> None:
+        self.fruit_ids: Dict[str, int] = fruit_ids
+        self.price_index: PriceIndex = price_index
+        # CSVの日時を解釈するタイムゾーン（settings.TIME_ZONE）
+        self.tz: tzinfo = tz
+        self.source: str = source
+
+    def parse_row(self, row: List[str]) -> Optional[ParsedRow]:
+        if len(row) != 4:
+            # 期待される数の値が含まれていない場合の処理
+            return None
+
+        fruit_name, quantity, total_amount, sale_date = row
+
+        fruit_id: Optional[int] = self.fruit_ids.get(fruit_name)
+        if fruit_id is None:
+            return None
+
+        try:
+            quantity_value: int = int(quantity)
+            total_amount_value: int = int(total_amount)
+            # 日付の形式が正しくない場合はValueErrorが発生
+            parsed_date: datetime = datetime.strptime(sale_date, SALE_DATE_FORMAT)
+        except ValueError:
+            return None
+
+        local_date: datetime = parsed_date.replace(tzinfo=self.tz)
+        price: Optional[int] = self.price_index.price_at(fruit_id, local_date)
+        if price is None or total_amount_value != quantity_value * price:
+            return None
+
+        fingerprint: str = sale_fingerprint(
+            fruit_name, quantity_value, total_amount_value,
+            parsed_date.strftime(SALE_DATE_FORMAT), self.source)
+        return fruit_name, quantity_value, total_amount_value, local_date, fingerprint
+
+    def parse_rows(self, rows: Iterable[List[str]]) -> ParsedChunk:
+        parsed: List[ParsedRow] = []
+        invalid: int = 0
+        for row in rows:
+            result: Optional[ParsedRow] = self.parse_row(row)
+            if result is None:
+                invalid += 1
+            else:
+                parsed.append(result)
+        return parsed, invalid
+
+
+def _ends_in_quoted_field(line: str, in_quoted: bool) -> bool:
+    """行末が引用符で囲まれた値の途中かどうかを返す。
+
+    csv.readerと同じく、引用符は値の先頭にある場合だけ引用の開始とみなす（値の途中の引用符は文字として扱う）。
+    """
+    if '"' not in line:
+        return in_quoted
+    at_field_start: bool = not in_quoted
+    index: int = 0
+    while index < len(line):
+        char: str = line[index]
+        if in_quoted:
+            if char == '"':
+                if line[index + 1:index + 2] == '"':
+                    # 引用符の中の "" は引用符1文字
+                    index += 1
+                else:
+                    in_quoted = False
+        elif char == '"' and at_field_start:
+            in_quoted = True
+        at_field_start = not in_quoted and char == ','
+        index += 1
+    return in_quoted
+
+
+def iter_line_chunks(stream: TextIO, chunk_lines: int = PARSE_CHUNK_LINES) -> Iterator[List[str]]:
+    """ストリームをレコード単位で区切ったチャンクとして読み出す。
+
+    引用符で囲まれた値に改行が含まれる場合も、単一プロセスでcsv.readerに渡した場合と同じ行に分割されるよう、
+    引用符で囲まれた値の途中では区切らない。閉じられない引用符でファイルの残りを1チャンクに溜めないよう、
+    チャンクは最大で chunk_lines の2倍の行数とし、それを超えるとその値の途中でも区切る（その行は不正な行になる）。
+    """
+    lines: List[str] = []
+    in_quoted: bool = False
+    for line in stream:
+        lines.append(line)
+        in_quoted = _ends_in_quoted_field(line, in_quoted)
+        if (len(lines) >= chunk_lines and not in_quoted) or len(lines) >= chunk_lines * 2:
+            yield lines
+            lines = []
+            in_quoted = False
+    if lines:
+        yield lines
+
+
+def _parse_lines(validator: RowValidator, lines: List[str]) -> ParsedChunk:
+    return validator.parse_rows(csv.reader(lines))
+
+
+def parse_in_pool(chunks: Iterable[List[str]], validator: RowValidator,
+                  workers: int) -> Iterator[ParsedChunk]:
+    """チャンクをプロセスプールで解析し、入力と同じ順序で結果を返す。"""
+    return map_in_pool(_parse_lines, chunks, validator, workers)
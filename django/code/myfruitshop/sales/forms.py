@@ -1,5 +1,9 @@
+from datetime import datetime, time, timedelta
+
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils import timezone
 from .models import Sale, Fruit
 from typing import Dict, Any, Union
 
@@ -24,6 +28,8 @@ class SaleAddForm(forms.ModelForm):
     class Meta:
         model = Sale
         fields = ['fruit', 'quantity', 'sale_date']
+        # 果物は全件の<select>を描画せず、オートコンプリートで選択したIDを送信する
+        widgets = {'fruit': forms.HiddenInput}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -60,21 +66,83 @@ class SaleCombinedForm(forms.ModelForm):
             raise forms.ValidationError('Selected fruit does not exist.')
 
         if 'total_amount' in cleaned_data:
-            current_price = fruit.price
-            total_amount = quantity * current_price
+            # 過去の販売は販売日時時点の単価で検証する
+            sale_date = cleaned_data.get('sale_date') or timezone.now()
+            total_amount = quantity * fruit.price_at(sale_date)
             if cleaned_data.get('total_amount') != total_amount:
                 raise forms.ValidationError(
-                    'Total amount does not match the current price.')
+                    'Total amount does not match the price at the sale date.')
 
         return cleaned_data
 
 class BulkSaleForm(forms.Form):
     csv_file = forms.FileField()
 
+    def clean_csv_file(self) -> Any:
+        csv_file = self.cleaned_data.get('csv_file')
+        if csv_file and not csv_file.name.lower().endswith(('.csv', '.csv.gz', '.zip')):
+            raise forms.ValidationError('CSVファイル（.csv / .csv.gz / .zip）を選択してください。')
+        return csv_file
+
+class SaleFilterForm(forms.Form):
+    fruit = forms.ModelChoiceField(
+        queryset=Fruit.objects.all(), required=False, widget=forms.HiddenInput)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    amount_min = forms.IntegerField(required=False, min_value=0)
+    amount_max = forms.IntegerField(required=False, min_value=0)
+
+    def clean(self) -> Dict[str, Any]:
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+        amount_min = cleaned_data.get('amount_min')
+        amount_max = cleaned_data.get('amount_max')
+
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError('開始日は終了日以前の日付を指定してください。')
+        if amount_min is not None and amount_max is not None and amount_min > amount_max:
+            raise forms.ValidationError('金額の下限は上限以下で指定してください。')
+
+        return cleaned_data
+
+    def filter(self, sales: models.QuerySet) -> models.QuerySet:
+        """販売日時・果物・金額の条件で絞り込む。
+
+        いずれも列に関数を掛けない範囲/等価条件とし、(is_active, sale_date)・(fruit, is_active, sale_date)・
+        (is_active, total_amount) のインデックスで絞り込めるようにする。
+        """
+        if not self.is_valid():
+            return sales
+
+        fruit = self.cleaned_data.get('fruit')
+        date_from = self.cleaned_data.get('date_from')
+        date_to = self.cleaned_data.get('date_to')
+        amount_min = self.cleaned_data.get('amount_min')
+        amount_max = self.cleaned_data.get('amount_max')
+
+        if fruit is not None:
+            sales = sales.filter(fruit=fruit)
+        if date_from:
+            sales = sales.filter(
+                sale_date__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+        if date_to:
+            # 終了日の翌日0時未満とし、sale_date列に関数を掛けない
+            sales = sales.filter(
+                sale_date__lt=timezone.make_aware(
+                    datetime.combine(date_to + timedelta(days=1), time.min)))
+        if amount_min is not None:
+            sales = sales.filter(total_amount__gte=amount_min)
+        if amount_max is not None:
+            sales = sales.filter(total_amount__lte=amount_max)
+
+        return sales
+
 class SaleEditForm(forms.ModelForm):
     class Meta:
         model = Sale
         fields = ['fruit', 'quantity', 'sale_date']
+        widgets = {'fruit': forms.HiddenInput}
 
     def clean(self) -> Dict[str, Any]:
         cleaned_data = super().clean()
@@ -85,9 +153,8 @@ class SaleEditForm(forms.ModelForm):
             raise forms.ValidationError('Selected fruit does not exist.')
 
         if 'total_amount' in cleaned_data:
-            current_price = fruit.price
-            total_amount = quantity * current_price
+            total_amount = quantity * fruit.price_at(cleaned_data.get('sale_date') or timezone.now())
             if cleaned_data.get('total_amount') != total_amount:
-                raise forms.ValidationError('Total amount does not match the current price.')
+                raise forms.ValidationError('Total amount does not match the price at the sale date.')
 
         return cleaned_data
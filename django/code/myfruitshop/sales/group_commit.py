@@ -0,0 +1,154 @@
+"""販売登録のグループコミット。
+
+同時に届いた販売の登録を1つのトランザクションとbulk_createにまとめ、コミット（fsync）の回数を減らす。
+呼び出し元はコミットが完了するまで待つため、1件ずつsave()する場合と同じく、応答時には登録済みになっている。
+登録した販売には主キーが設定され、コミット後に1件ずつpost_saveシグナルが送られる（pre_saveは送られない）。
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models.signals import post_save
+
+from .models import Sale
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROUP_COMMIT: Dict[str, Any] = {
+    'ENABLED': False,
+    # この件数が溜まるか、最初の1件からこの時間が経過したらコミットする
+    'MAX_ROWS': 100,
+    'MAX_DELAY_MS': 10,
+    # コミット完了を待つ上限（秒）
+    'SUBMIT_TIMEOUT': 30.0,
+}
+
+
+def get_group_commit_config() -> Dict[str, Any]:
+    return {**DEFAULT_GROUP_COMMIT, **getattr(settings, 'SALES_GROUP_COMMIT', {})}
+
+
+class SaleCommitTimeout(Exception):
+    """コミットを待つ上限を超えた。販売はバッファから取り除かれ、登録されない。"""
+
+
+class SaleCommitBuffer:
+    """販売をバッファに溜め、専用スレッドからまとめてコミットする。"""
+
+    def __init__(self, max_rows: int, max_delay_ms: int, submit_timeout: float) -> None:
+        self.max_rows: int = max_rows
+        self.max_delay: float = max_delay_ms / 1000
+        self.submit_timeout: float = submit_timeout
+        self._queue: 'queue.Queue[Tuple[Sale, Future]]' = queue.Queue()
+        self._thread: threading.Thread = threading.Thread(
+            target=self._run, name='sale-group-commit', daemon=True)
+        self._thread.start()
+
+    def submit(self, sale: Sale) -> Sale:
+        """販売をバッファに追加し、コミットされるまで待つ。登録に失敗した場合は例外を送出する。"""
+        future: Future = Future()
+        self._queue.put((sale, future))
+        try:
+            return future.result(timeout=self.submit_timeout)
+        except TimeoutError:
+            # まだバッファ内にあれば取り消し、後からコミットされないようにする（再試行しても重複しない）
+            if future.cancel():
+                raise SaleCommitTimeout from None
+            # コミット中のため取り消せない。結果が確定するまで待つ
+            return future.result()
+
+    def _run(self) -> None:
+        while True:
+            batch: List[Tuple[Sale, Future]] = self._collect()
+            # 長時間動き続けるスレッドのため、リクエストと同様に古い接続を閉じる
+            close_old_connections()
+            try:
+                self._flush(batch)
+            except Exception:
+                logger.exception('Group commit of %d sales failed', len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(DatabaseError('販売を登録できませんでした。'))
+
+    def _collect(self) -> List[Tuple[Sale, Future]]:
+        # 最初の1件が届くまで待ち、そこから最大MAX_DELAY_MSだけ後続を集める
+        batch: List[Tuple[Sale, Future]] = [self._queue.get()]
+        deadline: float = time.monotonic() + self.max_delay
+        while len(batch) < self.max_rows:
+            remaining: float = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[Tuple[Sale, Future]]) -> None:
+        # 待ち時間を超えて取り消された販売は登録しない。以降は呼び出し元から取り消せない
+        batch = [(sale, future) for sale, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        sales: List[Sale] = [sale for sale, _ in batch]
+        try:
+            with transaction.atomic():
+                # MySQLでも主キーを設定するため、bulk_createではなくbulk_insertで登録する
+                Sale.objects.bulk_insert(sales)
+        except DatabaseError:
+            # 不正な行が混ざっていても他の行は登録できるよう、1件ずつ登録し直す
+            logger.warning('Group commit of %d sales failed, retrying one by one', len(batch), exc_info=True)
+            self._flush_one_by_one(batch)
+            return
+
+        for sale, future in batch:
+            # save()と同じく、コミット済みの販売ごとにpost_saveを送る（集計キャッシュの無効化など）。
+            # レシーバーの例外はその販売の呼び出し元にだけ返す
+            try:
+                post_save.send(sender=Sale, instance=sale, created=True, update_fields=None,
+                               raw=False, using=sale._state.db)
+            except Exception as error:
+                future.set_exception(error)
+            else:
+                future.set_result(sale)
+
+    def _flush_one_by_one(self, batch: List[Tuple[Sale, Future]]) -> None:
+        for sale, future in batch:
+            try:
+                with transaction.atomic():
+                    sale.save()
+            except DatabaseError as error:
+                future.set_exception(error)
+            else:
+                future.set_result(sale)
+
+
+_buffer: Optional[SaleCommitBuffer] = None
+_buffer_lock: threading.Lock = threading.Lock()
+
+
+def get_sale_buffer() -> Optional[SaleCommitBuffer]:
+    """グループコミットが有効な場合、プロセス内で共有するバッファを返す。"""
+    global _buffer
+    config: Dict[str, Any] = get_group_commit_config()
+    if not config['ENABLED']:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = SaleCommitBuffer(config['MAX_ROWS'], config['MAX_DELAY_MS'], config['SUBMIT_TIMEOUT'])
+    return _buffer
+
+
+def save_sale(sale: Sale) -> Sale:
+    """新しい販売を登録する。グループコミットが有効ならバッファ経由でまとめてコミットする。"""
+    buffer: Optional[SaleCommitBuffer] = get_sale_buffer()
+    if buffer is None or transaction.get_connection().in_atomic_block:
+        # 呼び出し元のトランザクション内では、その一部として登録する必要がある
+        sale.save()
+        return sale
+    return buffer.submit(sale)
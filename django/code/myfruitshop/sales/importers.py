@@ -0,0 +1,165 @@
+import csv
+import gzip
+import logging
+import zipfile
+from collections import OrderedDict
+from io import TextIOWrapper
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, TextIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_sales_generation
+from .csv_parsing import (
+    PARSE_CHUNK_LINES,
+    ParsedChunk,
+    ParsedRow,
+    RowValidator,
+    iter_line_chunks,
+    occurrence_fingerprint,
+    parse_in_pool,
+)
+from .models import Fruit, FruitPriceHistory, Sale
+
+
+logger = logging.getLogger(__name__)
+
+# 1チャンクあたりの行数（重複判定のIN句とbulk_createの単位）
+IMPORT_CHUNK_SIZE: int = 1000
+CSV_ENCODING: str = 'utf-8'
+# 同じ内容の行の出現回数を数える範囲（直近に現れた異なる内容の行の数）。1行あたり約200バイトのため、
+# ファイルの大きさによらず10MB程度に収まる。同じ内容の行がこれより離れて現れた場合は、
+# 再アップロードと同じく取込済みとみなされる（販売日時順のCSVでは同じ時刻の行は近くに並ぶ）
+OCCURRENCE_WINDOW: int = 50000
+
+
+def open_upload(uploaded_file: UploadedFile) -> TextIO:
+    """アップロードされたCSV（.csv / .csv.gz / .zip）をテキストストリームとして開く。
+
+    圧縮ファイルは読み出しながら展開し、展開後の全体をディスクやメモリに置かない。
+    """
+    name: str = uploaded_file.name.lower()
+    if name.endswith('.gz'):
+        return TextIOWrapper(gzip.GzipFile(fileobj=uploaded_file.file), encoding=CSV_ENCODING)
+    if name.endswith('.zip'):
+        archive: zipfile.ZipFile = zipfile.ZipFile(uploaded_file.file)
+        members: List[zipfile.ZipInfo] = [
+            member for member in archive.infolist() if not member.is_dir()
+        ]
+        if not members:
+            raise zipfile.BadZipFile('archive contains no files')
+        return TextIOWrapper(archive.open(members[0]), encoding=CSV_ENCODING)
+    return TextIOWrapper(uploaded_file.file, encoding=CSV_ENCODING)
+
+
+class ImportResult:
+    def __init__(self) -> None:
+        self.created: int = 0
+        self.duplicates: int = 0
+        self.invalid: int = 0
+
+
+class SaleCsvImporter:
+    """CSVの行を検証し、取込済みの行を除いて販売情報を一括登録する。"""
+
+    def __init__(self, source: str, chunk_size: int = IMPORT_CHUNK_SIZE,
+                 occurrence_window: int = OCCURRENCE_WINDOW) -> None:
+        self.source: str = source
+        self.chunk_size: int = chunk_size
+        self.occurrence_window: int = occurrence_window
+        # 有効な果物と価格履歴を一度だけ読み込み、行ごとのクエリを避ける
+        self.fruits: Dict[str, Fruit] = {
+            fruit.name: fruit for fruit in Fruit.objects.filter(is_active=True)
+        }
+        fruit_ids: Dict[str, int] = {name: fruit.pk for name, fruit in self.fruits.items()}
+        self.validator: RowValidator = RowValidator(
+            fruit_ids,
+            FruitPriceHistory.load_index(fruit_ids.values()),
+            timezone.get_current_timezone(),
+            source,
+        )
+
+    def import_rows(self, rows: Iterable[List[str]]) -> ImportResult:
+        """csv.readerで分割済みの行を単一プロセスで取り込む（小さなファイル向け）。"""
+        return self._write(self._parse_inline(rows))
+
+    def import_stream(self, stream: TextIO, workers: int = 1,
+                      chunk_lines: int = PARSE_CHUNK_LINES) -> ImportResult:
+        """テキストストリームを行単位のチャンクに分け、workers > 1 ならプロセスプールで解析して取り込む。"""
+        if workers <= 1:
+            return self.import_rows(csv.reader(stream))
+        chunks: Iterator[ParsedChunk] = parse_in_pool(
+            iter_line_chunks(stream, chunk_lines), self.validator, workers)
+        return self._write(chunks)
+
+    def import_upload(self, uploaded_file: UploadedFile) -> ImportResult:
+        workers: int = 1
+        if uploaded_file.size >= settings.SALES_IMPORT_PARALLEL_THRESHOLD:
+            workers = settings.SALES_IMPORT_WORKERS
+        with open_upload(uploaded_file) as stream:
+            return self.import_stream(stream, workers)
+
+    def _parse_inline(self, rows: Iterable[List[str]]) -> Iterator[ParsedChunk]:
+        iterator: Iterator[List[str]] = iter(rows)
+        while True:
+            chunk: List[List[str]] = list(islice(iterator, self.chunk_size))
+            if not chunk:
+                return
+            yield self.validator.parse_rows(chunk)
+
+    def _write(self, chunks: Iterable[ParsedChunk]) -> ImportResult:
+        result: ImportResult = ImportResult()
+        # 内容のフィンガープリントごとの出現回数（直近に現れた OCCURRENCE_WINDOW 種類の行だけを保持する）
+        occurrences: 'OrderedDict[str, int]' = OrderedDict()
+        try:
+            for parsed, invalid in chunks:
+                result.invalid += invalid
+                parsed = self._number_occurrences(parsed, occurrences)
+                for start in range(0, len(parsed), self.chunk_size):
+                    self._import_chunk(parsed[start:start + self.chunk_size], result)
+        finally:
+            if result.created:
+                # bulk_createではシグナルが発生しないため、ここで集計キャッシュを無効化する。
+                # 途中のチャンクで失敗した場合も、登録済みのチャンクは集計に反映する
+                bump_sales_generation()
+
+        logger.info(
+            'CSV import from %s: created=%d duplicates=%d invalid=%d',
+            self.source, result.created, result.duplicates, result.invalid)
+        return result
+
+    def _number_occurrences(self, parsed: List[ParsedRow],
+                            occurrences: 'OrderedDict[str, int]') -> List[ParsedRow]:
+        numbered: List[ParsedRow] = []
+        for *values, fingerprint in parsed:
+            occurrence: int = occurrences.pop(fingerprint, 0)
+            occurrences[fingerprint] = occurrence + 1
+            if len(occurrences) > self.occurrence_window:
+                # 最も長く現れていない行の出現回数を捨てる
+                occurrences.popitem(last=False)
+            numbered.append((*values, occurrence_fingerprint(fingerprint, occurrence)))
+        return numbered
+
+    def _build_sale(self, row: ParsedRow) -> Sale:
+        fruit_name, quantity, total_amount, sale_date, fingerprint = row
+        return Sale(
+            fruit=self.fruits[fruit_name],
+            quantity=quantity,
+            total_amount=total_amount,
+            sale_date=sale_date,
+            import_fingerprint=fingerprint,
+        )
+
+    def _import_chunk(self, rows: List[ParsedRow], result: ImportResult) -> None:
+        if not rows:
+            return
+        # 取込済みの行は一意制約で登録しない。同じファイルが同時にアップロードされても二重に登録されず、
+        # 実際に登録した行数から重複としてスキップした行数を求める
+        with transaction.atomic():
+            created: List[Sale] = Sale.objects.bulk_insert(
+                [self._build_sale(row) for row in rows], ignore_conflicts=True)
+        result.created += len(created)
+        result.duplicates += len(rows) - len(created)
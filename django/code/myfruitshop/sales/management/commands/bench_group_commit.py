@@ -0,0 +1,65 @@
+import threading
+import time
+from typing import Callable, List, Optional
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from sales.group_commit import SaleCommitBuffer
+from sales.models import Fruit, Sale
+
+
+class Command(BaseCommand):
+    help = ('同時に販売を登録した場合のスループットを、1件ずつコミットする場合とグループコミットの場合で計測する。'
+            '計測用に登録した販売は最後に削除するため、本番以外のDBで実行すること')
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--clients', type=int, default=20, help='同時に登録するスレッド数')
+        parser.add_argument('--rows', type=int, default=50, help='1スレッドあたりの登録件数')
+        parser.add_argument('--max-rows', type=int, default=100)
+        parser.add_argument('--max-delay-ms', type=int, default=10)
+
+    def handle(self, *args, **options) -> None:
+        fruit: Optional[Fruit] = Fruit.objects.filter(is_active=True).first()
+        if fruit is None:
+            raise CommandError('有効な果物が登録されていません。')
+
+        last_pk: int = Sale.objects.aggregate(last=Max('pk'))['last'] or 0
+        total: int = options['clients'] * options['rows']
+        try:
+            direct: float = self.measure(lambda sale: sale.save(), fruit, options['clients'], options['rows'])
+            buffer: SaleCommitBuffer = SaleCommitBuffer(
+                options['max_rows'], options['max_delay_ms'], submit_timeout=60.0)
+            grouped: float = self.measure(buffer.submit, fruit, options['clients'], options['rows'])
+        finally:
+            Sale.objects.filter(pk__gt=last_pk).delete()
+
+        self.stdout.write(f'{total} sales from {options["clients"]} clients')
+        self.stdout.write(f'one commit per sale: {total / direct:.0f} rows/s ({direct:.3f}s)')
+        self.stdout.write(f'group commit:        {total / grouped:.0f} rows/s ({grouped:.3f}s, '
+                          f'{direct / grouped:.1f}x)')
+
+    def measure(self, save: Callable[[Sale], object], fruit: Fruit, clients: int, rows: int) -> float:
+        errors: List[BaseException] = []
+
+        def client() -> None:
+            try:
+                for _ in range(rows):
+                    save(Sale(fruit=fruit, quantity=1, total_amount=fruit.price, sale_date=timezone.now()))
+            except BaseException as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads: List[threading.Thread] = [threading.Thread(target=client) for _ in range(clients)]
+        start: float = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed: float = time.perf_counter() - start
+        if errors:
+            raise CommandError(f'登録に失敗しました: {errors[0]!r}')
+        return elapsed
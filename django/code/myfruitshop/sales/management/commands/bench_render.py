@@ -0,0 +1,78 @@
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, List
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.utils import timezone
+
+from sales.models import Fruit, Sale
+from sales.views import SalesAggregateView
+
+
+class Command(BaseCommand):
+    help = '販売一覧・販売統計テンプレートの描画時間を、フラグメントキャッシュが空の場合と温まった場合で計測する'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--rows', type=int, default=10, help='販売一覧の1ページあたりの行数')
+        parser.add_argument('--fruits', type=int, default=20, help='集計表の内訳に含める果物の数')
+
+    def handle(self, *args, **options) -> None:
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        templates: Dict[str, Callable[[], Dict[str, Any]]] = {
+            'sales_list_combined.html': lambda: self.sales_list_context(options['rows']),
+            'sales_aggregate.html': lambda: self.aggregate_context(options['fruits']),
+        }
+        for template_name, build_context in templates.items():
+            context: Dict[str, Any] = build_context()
+            cold: float = self.measure(template_name, context, request, options['iterations'], clear=True)
+            warm: float = self.measure(template_name, context, request, options['iterations'], clear=False)
+            self.stdout.write(
+                f'{template_name}: cold {cold * 1000:.3f} ms/page, warm {warm * 1000:.3f} ms/page '
+                f'({cold / warm:.1f}x)'
+            )
+
+    def measure(self, template_name: str, context: Dict[str, Any], request, iterations: int, clear: bool) -> float:
+        cache.clear()
+        render_to_string(template_name, context, request)
+        elapsed: float = 0.0
+        for _ in range(iterations):
+            if clear:
+                cache.clear()
+            start: float = time.perf_counter()
+            render_to_string(template_name, context, request)
+            elapsed += time.perf_counter() - start
+        return elapsed / iterations
+
+    def sales_list_context(self, rows: int) -> Dict[str, Any]:
+        # DBに依存しないよう、保存しないインスタンスで1ページ分を組み立てる
+        now = timezone.now()
+        fruit: Fruit = Fruit(id=1, name='りんご', price=100, updated_at=now)
+        sales: List[Sale] = [
+            Sale(id=i, fruit=fruit, quantity=i, total_amount=i * 100,
+                 sale_date=now - timedelta(hours=i), updated_at=now)
+            for i in range(1, rows + 1)
+        ]
+        return {'sales': Paginator(sales, rows).get_page(1), 'querystring': ''}
+
+    def aggregate_context(self, fruits: int) -> Dict[str, Any]:
+        view: SalesAggregateView = SalesAggregateView()
+        details: Dict[str, Dict[str, Any]] = {
+            f'fruit{i}': {'fruit': f'fruit{i}', 'amount': i * 1000, 'quantity': i} for i in range(fruits)
+        }
+        total: int = sum(detail['amount'] for detail in details.values())
+        monthly = [((2024, month), {'total': total, 'details': details}) for month in (3, 2, 1)]
+        daily = [((2024, 3, day), {'total': total, 'details': details}) for day in (3, 2, 1)]
+        return {
+            'total_sales': total * 3,
+            'monthly_data': view.build_rows(monthly),
+            'daily_data': view.build_rows(daily),
+            'generation': 1,
+        }
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from sales.warmup import warmup_steps
+
+
+class Command(BaseCommand):
+    help = ('DBに接続できるかを確認し、サーバーのウォームアップと同じクエリを実行して所要時間を表示する。'
+            'DB側のバッファは温まるが、キャッシュと準備完了の状態はサーバーのプロセスごとに持つため、'
+            'このコマンドでサーバーのキャッシュが作成されたり /healthz/ready が200になったりはしない')
+
+    def handle(self, *args, **options) -> None:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            for name, step in warmup_steps():
+                start: float = time.perf_counter()
+                step()
+                self.stdout.write(f'{name}: {(time.perf_counter() - start) * 1000:.1f} ms')
+        except DatabaseError as exc:
+            raise CommandError(f'Database pre-check failed: {exc}') from exc
+        self.stdout.write(self.style.SUCCESS(
+            'Database pre-check passed. Server processes warm their own caches at startup.'))
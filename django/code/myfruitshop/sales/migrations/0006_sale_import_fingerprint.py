@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_sale_is_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='import_fingerprint',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_sale_import_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fruit',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='sale_date',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-19 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_index_fruit_name_sale_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['is_active', 'sale_date'], name='sale_active_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['fruit', 'is_active', 'sale_date'], name='sale_fruit_active_date_idx'),
+        ),
+    ]
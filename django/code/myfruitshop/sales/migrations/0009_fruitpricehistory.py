@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-19 10:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def seed_price_history(apps, schema_editor):
+    # 既存の果物は現在の単価を登録日時から有効な履歴として登録する。
+    # 実際の単価の記録ではないため is_seeded とし、監査ではこの期間の売上金額を書き換えない
+    Fruit = apps.get_model('sales', 'Fruit')
+    FruitPriceHistory = apps.get_model('sales', 'FruitPriceHistory')
+    FruitPriceHistory.objects.bulk_create(
+        [
+            FruitPriceHistory(fruit_id=fruit_id, price=price, valid_from=created_at, is_seeded=True)
+            for fruit_id, price, created_at in Fruit.objects.values_list('id', 'price', 'created_at').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_sale_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FruitPriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.PositiveIntegerField()),
+                ('valid_from', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('is_seeded', models.BooleanField(default=False)),
+                ('fruit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='sales.fruit')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='fruitpricehistory',
+            index=models.Index(fields=['fruit', 'valid_from'], name='price_history_fruit_from_idx'),
+        ),
+        migrations.RunPython(seed_price_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-19 14:05
+
+from django.db import migrations, models, transaction
+from django.utils import timezone
+
+# 1回の更新で処理する販売の件数
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def backfill_local_calendar_keys(apps, schema_editor):
+    # 大きなテーブルでもロックを長時間保持しないよう、IDの昇順にチャンクごとにコミットする
+    Sale = apps.get_model('sales', 'Sale')
+    tz = timezone.get_default_timezone()
+    last_pk = 0
+    while True:
+        sales = list(
+            Sale.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'sale_date')[:BACKFILL_CHUNK_SIZE]
+        )
+        if not sales:
+            break
+        for sale in sales:
+            local = timezone.localtime(sale.sale_date, tz)
+            sale.sale_local_date = local.date()
+            sale.sale_year_month = local.year * 100 + local.month
+        with transaction.atomic():
+            Sale.objects.bulk_update(sales, ['sale_local_date', 'sale_year_month'], batch_size=1000)
+        last_pk = sales[-1].pk
+
+
+class Migration(migrations.Migration):
+    # バックフィルをチャンクごとにコミットするため、マイグレーション全体を1つのトランザクションにしない
+    atomic = False
+
+    dependencies = [
+        ('sales', '0009_fruitpricehistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='sale_local_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='sale_year_month',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_local_calendar_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='sale',
+            name='sale_local_date',
+            field=models.DateField(db_index=True, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='sale_year_month',
+            field=models.PositiveIntegerField(db_index=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-19 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0010_sale_local_calendar_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['is_active', 'total_amount'], name='sale_active_amount_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_sale_amount_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='insert_token',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='import_fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
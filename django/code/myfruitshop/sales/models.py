@@ -1,23 +1,158 @@
-from django.db import models
+import uuid
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db import connections, models, transaction
+from django.utils import timezone
+
+from .pricing import PriceIndex
 
 class Fruit(models.Model):
-    name: str = models.CharField(max_length=255)
+    name: str = models.CharField(max_length=255, db_index=True)
     price: int = models.PositiveIntegerField()
     created_at: models.DateTimeField = models.DateTimeField(auto_now_add=True)
     updated_at: models.DateTimeField = models.DateTimeField(auto_now=True)
     is_active: bool = models.BooleanField(default=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values) -> 'Fruit':
+        instance: Fruit = super().from_db(db, field_names, values)
+        # 保存時に単価が変わったかを判定するため、読み込み時の単価を保持する
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
+    def save(self, *args, **kwargs) -> None:
+        price_changed: bool = self._state.adding or self.price != getattr(self, '_loaded_price', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if price_changed:
+                FruitPriceHistory.objects.create(fruit=self, price=self.price, valid_from=timezone.now())
+        self._loaded_price = self.price
+
+    def price_at(self, when: datetime) -> int:
+        """販売日時時点の単価を返す（履歴が無い場合は現在の単価）。"""
+        price: Optional[int] = FruitPriceHistory.load_index([self.pk]).price_at(self.pk, when)
+        return self.price if price is None else price
+
     def __str__(self) -> str:
         return self.name
 
+
+class FruitPriceHistory(models.Model):
+    fruit: models.ForeignKey = models.ForeignKey(
+        Fruit, on_delete=models.CASCADE, related_name='price_history')
+    price: int = models.PositiveIntegerField()
+    # この単価が適用され始めた日時
+    valid_from: models.DateTimeField = models.DateTimeField()
+    created_at: models.DateTimeField = models.DateTimeField(auto_now_add=True)
+    # 価格履歴の導入時に、登録日時から現在の単価が有効だったと推定して登録した履歴
+    is_seeded: bool = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fruit', 'valid_from'], name='price_history_fruit_from_idx'),
+        ]
+
+    @classmethod
+    def load_index(cls, fruit_ids: Optional[Iterable[int]] = None) -> PriceIndex:
+        """指定した果物（省略時は全件）の価格履歴を1回のクエリで読み込む。"""
+        history: models.QuerySet = cls.objects.order_by('fruit_id', 'valid_from')
+        if fruit_ids is not None:
+            history = history.filter(fruit_id__in=list(fruit_ids))
+        return PriceIndex.from_rows(history.values_list('fruit_id', 'valid_from', 'price', 'is_seeded').iterator())
+
+    def __str__(self) -> str:
+        return f"{self.fruit_id} - {self.price} - {self.valid_from}"
+
+
+def local_calendar_keys(sale_date: datetime) -> Tuple[date, int]:
+    """販売日時から、settings.TIME_ZONEでの日付と年月（YYYYMM）を返す。"""
+    local: datetime = timezone.localtime(sale_date, timezone.get_default_timezone())
+    return local.date(), local.year * 100 + local.month
+
+
+class SaleQuerySet(models.QuerySet):
+    # save()を経由しない一括登録・更新でも、販売日時から日付・年月を設定する
+
+    def bulk_create(self, objs: Iterable['Sale'], *args, **kwargs) -> List['Sale']:
+        objs = list(objs)
+        for sale in objs:
+            sale.set_local_calendar_keys()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs: Iterable['Sale'], fields: Sequence[str], *args, **kwargs) -> int:
+        if 'sale_date' in fields:
+            objs = list(objs)
+            for sale in objs:
+                sale.set_local_calendar_keys()
+            fields = [*fields, 'sale_local_date', 'sale_year_month']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def bulk_insert(self, objs: Iterable['Sale'], ignore_conflicts: bool = False) -> List['Sale']:
+        """販売を一括登録し、実際に登録した販売を主キーを設定して返す。
+
+        ignore_conflicts=True なら、import_fingerprintが登録済みの販売と重複する行は登録しない。
+        bulk_createはその場合に登録した行を区別できず、MySQLでは主キーも返さないため、行ごとに一時的なトークンを
+        付けて登録し、主キーを読み戻してからトークンを消す。呼び出し元のトランザクション内で呼ぶこと。
+        """
+        objs = list(objs)
+        if not ignore_conflicts and connections[self.db].features.can_return_rows_from_bulk_insert:
+            return self.bulk_create(objs)
+        for sale in objs:
+            sale.insert_token = uuid.uuid4().hex
+        self.bulk_create(objs, ignore_conflicts=ignore_conflicts)
+        pks: Dict[str, int] = dict(
+            self.filter(insert_token__in=[sale.insert_token for sale in objs]).values_list('insert_token', 'pk')
+        )
+        self.filter(pk__in=list(pks.values())).update(insert_token=None)
+        inserted: List[Sale] = []
+        for sale in objs:
+            sale.pk = pks.get(sale.insert_token)
+            sale.insert_token = None
+            sale._state.adding = sale.pk is None
+            if sale.pk is not None:
+                inserted.append(sale)
+        return inserted
+
+
 class Sale(models.Model):
     fruit: models.ForeignKey = models.ForeignKey(Fruit, on_delete=models.CASCADE)
     quantity: int = models.PositiveIntegerField()
     total_amount: int = models.PositiveIntegerField()
-    sale_date: models.DateTimeField = models.DateTimeField()
+    sale_date: models.DateTimeField = models.DateTimeField(db_index=True)
     created_at: models.DateTimeField = models.DateTimeField(auto_now_add=True)
     updated_at: models.DateTimeField = models.DateTimeField(auto_now=True)
     is_active: bool = models.BooleanField(default=True)
+    # CSV取込時の重複判定用フィンガープリント（画面から登録した販売はNULL）
+    import_fingerprint: str = models.CharField(
+        max_length=64, null=True, blank=True, unique=True)
+    # bulk_insert()で登録した行を読み戻すための一時的なトークン（登録後は常にNULL）
+    insert_token: str = models.CharField(max_length=32, null=True, blank=True, editable=False, db_index=True)
+    # 日別・月別の集計と管理画面の日付階層用に、sale_dateをsettings.TIME_ZONEの日付・年月（YYYYMM）に変換した値
+    sale_local_date: date = models.DateField(editable=False, db_index=True)
+    sale_year_month: int = models.PositiveIntegerField(editable=False, db_index=True)
+
+    objects = SaleQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # 販売一覧（有効な販売を販売日時の降順）と果物での絞り込み用
+            models.Index(fields=['is_active', 'sale_date'], name='sale_active_date_idx'),
+            models.Index(fields=['fruit', 'is_active', 'sale_date'], name='sale_fruit_active_date_idx'),
+            # 販売一覧の金額での絞り込み用
+            models.Index(fields=['is_active', 'total_amount'], name='sale_active_amount_idx'),
+        ]
+
+    def set_local_calendar_keys(self) -> None:
+        if self.sale_date is not None:
+            self.sale_local_date, self.sale_year_month = local_calendar_keys(self.sale_date)
+
+    def save(self, *args, **kwargs) -> None:
+        self.set_local_calendar_keys()
+        update_fields: Optional[Iterable[str]] = kwargs.get('update_fields')
+        if update_fields is not None and 'sale_date' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'sale_local_date', 'sale_year_month'}
+        super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return f"{self.fruit.name} - {self.quantity} units - {self.sale_date}"
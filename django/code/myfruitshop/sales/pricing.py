@@ -0,0 +1,51 @@
+"""果物の価格履歴から、任意の時点の単価を引くための索引。
+
+プロセスプールのワーカーにも渡すため、Djangoには依存しない。
+"""
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class PriceIndex:
+    """果物ごとに価格改定の開始日時を昇順に保持し、bisectで時点の単価を求める。"""
+
+    def __init__(self) -> None:
+        # fruit_id -> (valid_fromの昇順リスト, 対応する単価のリスト)
+        self.intervals: Dict[int, Tuple[List[datetime], List[int]]] = {}
+        # fruit_id -> 各履歴が価格履歴の導入時に推定で登録したものか（intervalsと同じ順序）
+        self.seeded: Dict[int, List[bool]] = {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, datetime, int, bool]]) -> 'PriceIndex':
+        """(fruit_id, valid_from, price, is_seeded) を valid_from の昇順で受け取って索引を作る。"""
+        index: PriceIndex = cls()
+        for fruit_id, valid_from, price, is_seeded in rows:
+            starts, prices = index.intervals.setdefault(fruit_id, ([], []))
+            starts.append(valid_from)
+            prices.append(price)
+            index.seeded.setdefault(fruit_id, []).append(is_seeded)
+        return index
+
+    def price_at(self, fruit_id: int, when: datetime) -> Optional[int]:
+        interval: Optional[Tuple[List[datetime], List[int]]] = self.intervals.get(fruit_id)
+        if interval is None:
+            return None
+        starts, prices = interval
+        position: int = bisect_right(starts, when) - 1
+        # 最初の履歴より前の販売は、最初に登録された単価で扱う
+        return prices[max(position, 0)]
+
+    def recorded_price_at(self, fruit_id: int, when: datetime) -> Optional[int]:
+        """when 時点の単価を、実際に記録された履歴から求められる場合だけ返す。
+
+        最初の履歴より前の日時や、価格履歴の導入時に推定で登録した履歴（登録日時から現在の単価）の期間はNone。
+        """
+        interval: Optional[Tuple[List[datetime], List[int]]] = self.intervals.get(fruit_id)
+        if interval is None:
+            return None
+        starts, prices = interval
+        position: int = bisect_right(starts, when) - 1
+        if position < 0 or self.seeded[fruit_id][position]:
+            return None
+        return prices[position]
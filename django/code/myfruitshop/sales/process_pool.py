@@ -0,0 +1,46 @@
+"""入力の順序を保ったまま、spawnのプロセスプールで処理する。
+
+ワーカーは関数の参照を解決するためにこのモジュールを読み込むため、Djangoには依存しない。
+"""
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Iterable, Iterator, Optional, TypeVar
+
+State = TypeVar('State')
+Item = TypeVar('Item')
+Result = TypeVar('Result')
+
+# ワーカープロセスごとに一度だけ受け取る状態（検証器など）
+_worker_state: Any = None
+
+
+def _init_worker(state: Any, setup: Optional[Callable[[], None]]) -> None:
+    global _worker_state
+    if setup is not None:
+        setup()
+    _worker_state = state
+
+
+def _call(func: Callable[[Any, Any], Any], item: Any) -> Any:
+    return func(_worker_state, item)
+
+
+def map_in_pool(func: Callable[[State, Item], Result], items: Iterable[Item], state: State,
+                workers: int, setup: Optional[Callable[[], None]] = None) -> Iterator[Result]:
+    """func(state, item) をプロセスプールで実行し、入力と同じ順序で結果を返す。
+
+    state はワーカーの起動時に一度だけpickleして渡し、setup があればその前にワーカーで実行する。
+    先読みする入力をワーカー数の2倍までに抑え、入力や結果が大きくてもメモリ使用量を一定に保つ。
+    func と setup はモジュールの最上位で定義した関数であること。
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(state, setup)) as executor:
+        pending: Deque[Future] = deque()
+        for item in items:
+            pending.append(executor.submit(_call, func, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
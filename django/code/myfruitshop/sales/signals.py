@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_sales_generation, invalidate_fruit_catalog
+from .models import Fruit, Sale
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=Fruit)
+@receiver(post_delete, sender=Fruit)
+def invalidate_sales_cache(sender, **kwargs) -> None:
+    bump_sales_generation()
+
+
+@receiver(post_save, sender=Fruit)
+@receiver(post_delete, sender=Fruit)
+def invalidate_fruit_catalog_cache(sender, **kwargs) -> None:
+    invalidate_fruit_catalog()
@@ -10,6 +10,7 @@ from .views import (
     EditSaleView,
     DeleteSaleView,
     SalesAggregateView,
+    FruitAutocompleteView,
 )
 
 
@@ -26,4 +27,5 @@ urlpatterns = [
     path('edit_sales/<int:pk>/', EditSaleView.as_view(), name='edit_sales'),
     path('delete_sale/<int:pk>/', DeleteSaleView.as_view(), name='delete_sale'),
     path('sales_aggregate/', SalesAggregateView.as_view(), name='sales_aggregate'),
+    path('fruit_autocomplete/', FruitAutocompleteView.as_view(), name='fruit_autocomplete'),
 ]
@@ -1,21 +1,35 @@
 from decimal import Decimal
-from datetime import datetime, timedelta, timezone as dt_timezone
-from typing import List, Tuple, Dict, Any, Union
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, List, Tuple, Dict, Any, Optional, Union
 from collections import defaultdict
-import csv
+from concurrent.futures.process import BrokenProcessPool
+from bisect import bisect_left
+from itertools import islice, takewhile
+from operator import itemgetter
 import logging
-from io import TextIOWrapper
+import zipfile
 
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from django.shortcuts import get_object_or_404, render, redirect
+from django.http import JsonResponse
+from django.core.files.uploadedfile import UploadedFile
 from django.core.paginator import Paginator
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.views.generic import ListView, UpdateView, DeleteView, View
 from django.db import models
+from django.db.models import Sum
 
+from myfruitshop.templatetags.custom_filters import format_md_tuple, format_sales_data
+
+from .cache import fruit_catalog, sales_generation
 from .models import Fruit, Sale
-from .forms import SaleCombinedForm, SaleAddForm, FruitForm, BulkSaleForm, SaleEditForm
+from .forms import SaleCombinedForm, SaleAddForm, FruitForm, BulkSaleForm, SaleEditForm, SaleFilterForm
+from .group_commit import SaleCommitTimeout, save_sale
+from .importers import ImportResult, SaleCsvImporter
 
 
 logger = logging.getLogger(__name__)
@@ -105,60 +119,72 @@ class SaleCombinedView(LoginRequiredMixin, View):
     paginate_by: int = 10  # ページあたりのアイテム数
 
     def get(self, request) -> render:
-        sales: models.Model = Sale.objects.select_related('fruit').filter(
-            is_active=True).order_by('-sale_date')
+        form_filter: SaleFilterForm = SaleFilterForm(request.GET or None)
+        sales: models.QuerySet = form_filter.filter(
+            Sale.objects.select_related('fruit').filter(is_active=True)
+        ).order_by('-sale_date')
 
         paginator: Paginator = Paginator(sales, self.paginate_by)
         page: int = request.GET.get('page')
         sales: models.Model = paginator.get_page(page)
+        # 全ページへのリンクは描画せず、現在ページの前後のみ表示する
+        page_range = paginator.get_elided_page_range(sales.number, on_each_side=2, on_ends=1)
+
+        # ページ移動時に絞り込み条件を引き継ぐ
+        query_params = request.GET.copy()
+        query_params.pop('page', None)
 
         form_sale: models.Model = SaleCombinedForm()
         form_bulk_sale: models.Model = BulkSaleForm()
 
-        return render(request, self.template_name, {'sales': sales, 'form_sale': form_sale, 'form_bulk_sale': form_bulk_sale})
+        return render(request, self.template_name, {
+            'sales': sales,
+            'page_range': page_range,
+            'querystring': query_params.urlencode(),
+            'form_filter': form_filter,
+            'filter_fruit': form_filter.cleaned_data.get('fruit') if form_filter.is_valid() else None,
+            'form_sale': form_sale,
+            'form_bulk_sale': form_bulk_sale,
+        })
 
     def post(self, request, *args, **kwargs) -> render:
         form_bulk_sale: models.Model = BulkSaleForm(
             request.POST, request.FILES)
 
         if form_bulk_sale.is_valid():
-            csv_file: TextIOWrapper = TextIOWrapper(
-                request.FILES['csv_file'].file, encoding='utf-8')
-            reader: csv.reader = csv.reader(csv_file)
-            for row in reader:
-                if len(row) != 4:
-                    # 期待される数の値が含まれていない場合の処理
-                    continue
-
-                fruit_name, quantity, total_amount, sale_date = row
-
-                try:
-                    fruit: models.Model = Fruit.objects.filter(name=fruit_name, is_active=True).get()
-                except Fruit.DoesNotExist:
-                    continue
-
-                current_price: int = fruit.price
-                expected_total_amount: int = int(quantity) * current_price
-
-                try:
-                    # 日付の形式が正しくない場合はValidationErrorが発生
-                    datetime.strptime(sale_date, "%Y-%m-%d %H:%M")
-                except ValueError:
-                    continue
-
-                if int(total_amount) != expected_total_amount:
-                    continue
-
-                Sale.objects.create(
-                    fruit=fruit,
-                    quantity=int(quantity),
-                    total_amount=int(total_amount),
-                    sale_date=sale_date
+            uploaded_file: UploadedFile = request.FILES['csv_file']
+            try:
+                result: ImportResult = SaleCsvImporter(uploaded_file.name).import_upload(uploaded_file)
+            except (OSError, EOFError, UnicodeDecodeError, zipfile.BadZipFile, BrokenProcessPool):
+                # 壊れた圧縮ファイルや、解析中に異常終了したワーカーなど。
+                # 取込済みのチャンクは再アップロード時に重複として除外される
+                logger.exception('Failed to read uploaded CSV %s', uploaded_file.name)
+                messages.error(request, 'ファイルを読み込めませんでした。')
+            else:
+                messages.info(
+                    request,
+                    f'{result.created}件を登録しました。'
+                    f'（重複スキップ: {result.duplicates}件、不正な行: {result.invalid}件）'
                 )
+        else:
+            for error in form_bulk_sale.errors.get('csv_file', []):
+                messages.error(request, error)
 
         return self.get(request, *args, **kwargs)
 
 
+class FruitAutocompleteView(LoginRequiredMixin, View):
+    limit: int = 10
+
+    def get(self, request) -> JsonResponse:
+        query: str = request.GET.get('q', '').strip()
+        # 名前順のカタログ（キャッシュ）を二分探索し、前方一致する果物を返す
+        catalog: List[Dict[str, Any]] = fruit_catalog()
+        start: int = bisect_left(catalog, query, key=itemgetter('name'))
+        matches = takewhile(lambda fruit: fruit['name'].startswith(query), islice(catalog, start, None))
+        return JsonResponse({'results': list(islice(matches, self.limit))})
+
+
 class AddSaleView(LoginRequiredMixin, View):
     template_name: str = 'add_sales.html'
 
@@ -181,14 +207,20 @@ class AddSaleView(LoginRequiredMixin, View):
                 form_sale.add_error('fruit', '選択した果物は存在しません。')
                 return render(request, self.template_name, {'form': form_sale})
 
-            # SaleCombinedViewでのバリデーション
-            current_price: int = fruit.price
-            total_amount: Decimal = quantity * current_price
+            # 過去の日付の販売も、CSV取込と同じく販売日時時点の単価で計算する
+            price: int = fruit.price_at(sale.sale_date)
+            total_amount: Decimal = quantity * price
 
             # 計算結果をsaleオブジェクトのtotal_amountフィールドに代入
             sale.total_amount = Decimal(total_amount)
 
-            sale.save()
+            # グループコミットが有効な場合は、同時に届いた販売とまとめてコミットされるまで待つ
+            try:
+                save_sale(sale)
+            except SaleCommitTimeout:
+                # 販売は登録されていないため、そのまま再送できる
+                form_sale.add_error(None, '混雑のため登録できませんでした。もう一度登録してください。')
+                return render(request, self.template_name, {'form': form_sale})
             logger.info('This is an info message in get_object AddSaleView.')
             return redirect('sales_combined')  # 保存後、販売情報管理画面にリダイレクト
 
@@ -218,8 +250,9 @@ class EditSaleView(LoginRequiredMixin, View):
                 form.add_error('fruit', '選択した果物は存在しません。')
                 return render(request, self.template_name, {'form': form})
 
-            current_price: int = fruit.price
-            total_amount: Decimal = quantity * current_price
+            # 販売日時を変更した場合も、その時点の単価で計算し直す
+            price: int = fruit.price_at(sale.sale_date)
+            total_amount: Decimal = quantity * price
 
             # 計算結果をsaleオブジェクトのtotal_amountフィールドに代入
             sale.total_amount = Decimal(total_amount)
@@ -250,143 +283,104 @@ class SalesAggregateView(LoginRequiredMixin, View):
     template_name: str = 'sales_aggregate.html'
 
     def __init__(self, *args, **kwargs):
-
-        # 現在時刻を取得
-        current_time = datetime.now(timezone.utc)
-        # 日本時間に変換
-        current_time_jp = current_time.astimezone(
-            dt_timezone(timedelta(hours=9)))
-        self.end_of_day = current_time_jp.replace(second=59, minute=59, hour=23)
-        # 月次集計の開始日（当日を含めた3ヶ月）
-        start_year = current_time_jp.year - 1 if (current_time_jp.month - 2) <= 0 else current_time_jp.year
-        self.start_date_monthly = datetime(
-            start_year, (current_time_jp.month - 2) % 12, 1, 0, 0, 0, tzinfo=dt_timezone(timedelta(hours=9)))
+        super().__init__(*args, **kwargs)
+        # 現在時刻を日本時間（settings.TIME_ZONE）で取得
+        current_time_jp: datetime = timezone.localtime()
+        self.today: date = current_time_jp.date()
+        self.end_of_day: datetime = current_time_jp.replace(hour=23, minute=59, second=59, microsecond=0)
+        # 月次集計の開始日（当月を含めた3ヶ月）
+        month_index: int = self.today.year * 12 + self.today.month - 1 - 2
+        self.start_date_monthly: datetime = current_time_jp.replace(
+            year=month_index // 12, month=month_index % 12 + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
         # 日次集計の開始日（当日を含めた3日）
-        # 日数の補正
-        adjusted_day = current_time_jp.day - 2
-        adjusted_month = current_time_jp.month
-        adjusted_year = current_time_jp.year
-
-        while adjusted_day < 1:
-            # 日が1未満の場合は前月の末日を取得し、補正する
-            current_time_jp = (current_time_jp.replace(day=1) - timedelta(days=1)).replace(day=1)
-            adjusted_day += current_time_jp.day
-            adjusted_month = current_time_jp.month
-
-            # 年がまたがる場合の補正
-            if adjusted_month == 12:
-                adjusted_year -= 1
-
-        self.start_date_daily = datetime(
-            adjusted_year, adjusted_month, adjusted_day, 0, 0, 0, tzinfo=dt_timezone(timedelta(hours=9)))
-
-    def format_data(
-        self, sales_data: List[models.Model], is_monthly: bool = True
-    ) -> List[Tuple[Tuple[Any, ...], Dict[str, Union[int, List[Dict[str, Union[str, Decimal, int]]]]]]]:
-        formatted_data: Dict[Tuple[Any, ...], Dict[str, Union[int, List[Dict[str, Union[str, Decimal, int]]]]]] = defaultdict(
-            lambda: {'total': 0, 'details': {}}
-        )
-
-        if is_monthly:
-            # 月次集計の開始日（当月を含めた三ヶ月）
-            start_date = self.start_date_monthly
-        else:
-            # 日次集計の開始日（当日を含めた3日）
-            start_date = self.start_date_daily
-
-        for sale in sales_data:
-            # 指定された期間内のデータのみ処理
-            if start_date <= sale.sale_date <= self.end_of_day and sale.is_active:
-                key: Tuple[Any, ...] = (
-                    sale.sale_date.year,
-                    sale.sale_date.month
-                ) if is_monthly else (
-                    sale.sale_date.year,
-                    sale.sale_date.month,
-                    sale.sale_date.day
-                )
-                total_amount: Decimal = sale.total_amount
-
-                # 新しいデータを作成する場合
-                if key not in formatted_data:
-                    formatted_data[key] = {'total': 0, 'details': {}}
-
-                details: Dict[str, Union[str, Decimal, int]] = formatted_data[key]['details'].get(
-                    sale.fruit.name
-                )
+        self.start_date_daily: datetime = (current_time_jp - timedelta(days=2)).replace(
+            hour=0, minute=0, second=0, microsecond=0)
+
+    def build_rows(
+        self, data: List[Tuple[Tuple[Any, ...], Dict[str, Union[int, List[Dict[str, Union[str, Decimal, int]]]]]]]
+    ) -> List[Dict[str, Any]]:
+        # 表示用の文字列はバケットごとに一度だけ組み立て、テンプレートでは整形しない
+        return [
+            {
+                'label': format_md_tuple(key),
+                'total': details['total'],
+                'breakdown': format_sales_data(details['details']),
+            }
+            for key, details in data
+        ]
 
-                # すでに同じ果物のデータがある場合は合算する
-                if details:
-                    details['amount'] += total_amount
-                    details['quantity'] += sale.quantity
-                else:
-                    details = {
-                        'fruit': sale.fruit.name,
-                        'amount': total_amount,
-                        'quantity': sale.quantity,
-                    }
+    def summarize(
+        self, rows: Iterable[Dict[str, Any]], key: Callable[[Dict[str, Any]], Tuple[int, ...]]
+    ) -> List[Tuple[Tuple[int, ...], Dict[str, Any]]]:
+        # 期間・果物ごとの集計行を、期間ごとの合計と果物別の内訳にまとめる（新しい期間から順に並べる）
+        formatted_data: Dict[Tuple[int, ...], Dict[str, Any]] = defaultdict(lambda: {'total': 0, 'details': {}})
+        for row in rows:
+            bucket: Dict[str, Any] = formatted_data[key(row)]
+            bucket['details'][row['fruit__name']] = {
+                'fruit': row['fruit__name'],
+                'amount': row['amount'],
+                'quantity': row['quantity'],
+            }
+            bucket['total'] += row['amount']
+        return sorted(formatted_data.items(), key=lambda x: x[0], reverse=True)
+
+    def aggregate_buckets(self, last_pk: Optional[int] = None) -> Dict[str, Any]:
+        """累計と、月別・日別の期間ごとの合計と果物別の内訳（表示用に整形する前の値）を返す。
+
+        last_pk を指定すると、その販売IDまでの販売だけを集計する（監査で行の合計と比べる場合）。
+        """
+        active_sales: models.QuerySet = Sale.objects.filter(is_active=True)
+        if last_pk is not None:
+            active_sales = active_sales.filter(pk__lte=last_pk)
 
-                formatted_data[key]['details'][sale.fruit.name] = details
-                formatted_data[key]['total'] += total_amount
+        # 累計
+        total_sales: int = active_sales.aggregate(total=Sum('total_amount'))['total'] or 0
+
+        # 月別集計・日別集計はsettings.TIME_ZONEでの年月（YYYYMM）・日付の列で絞り込み、DBで集計する
+        monthly_rows: models.QuerySet = active_sales.filter(
+            sale_year_month__gte=self.start_date_monthly.year * 100 + self.start_date_monthly.month,
+            sale_year_month__lte=self.today.year * 100 + self.today.month,
+            # 当月の明日以降の日付の販売は日別集計と同じく含めない
+            sale_local_date__lte=self.today,
+        ).values('sale_year_month', 'fruit__name').annotate(
+            amount=Sum('total_amount'), quantity=Sum('quantity')).order_by('sale_year_month', 'fruit__name')
+        daily_rows: models.QuerySet = active_sales.filter(
+            sale_local_date__gte=self.start_date_daily.date(),
+            sale_local_date__lte=self.today,
+        ).values('sale_local_date', 'fruit__name').annotate(
+            amount=Sum('total_amount'), quantity=Sum('quantity')).order_by('sale_local_date', 'fruit__name')
+
+        monthly_data = self.summarize(
+            monthly_rows, key=lambda row: divmod(row['sale_year_month'], 100))
+        daily_data = self.summarize(
+            daily_rows, key=lambda row: (row['sale_local_date'].year, row['sale_local_date'].month,
+                                         row['sale_local_date'].day))
+
+        return {
+            'total_sales': total_sales,
+            'monthly_data': monthly_data,
+            'daily_data': daily_data,
+        }
 
-        # 期間の部分をソート
-        sorted_data: List[Tuple[Tuple[Any, ...], Dict[str, Union[int, List[Dict[str, Union[str, Decimal, int]]]]]]] = sorted(
-            formatted_data.items(), key=lambda x: x[0]
-        )
+    def aggregate(self) -> Dict[str, Any]:
+        buckets: Dict[str, Any] = self.aggregate_buckets()
+        return {
+            'total_sales': buckets['total_sales'],
+            'monthly_data': self.build_rows(buckets['monthly_data']),
+            'daily_data': self.build_rows(buckets['daily_data']),
+        }
 
-        # 一番古いデータを削除(4ヶ月前 OR 4日前のデータ)
-        if sorted_data and len(sorted_data) > 3:
-            oldest_data: Tuple[Any, ...] = sorted_data[0]
-            del formatted_data[oldest_data[0]]
+    def get_context(self) -> Dict[str, Any]:
+        generation: int = sales_generation()
+        # 集計結果は販売データの世代と集計日ごとにキャッシュする（販売・果物の変更で世代が進む）
+        cache_key: str = f'sales_aggregate:{generation}:{self.end_of_day:%Y%m%d}'
+        context: Optional[Dict[str, Any]] = cache.get(cache_key)
+        if context is None:
+            context = self.aggregate()
+            cache.set(cache_key, context, settings.SALES_AGGREGATE_CACHE_TIMEOUT)
 
-        return formatted_data.items()
+        context['generation'] = generation
+        return context
 
     def get(self, request, *args, **kwargs) -> Any:
-        # Get all sales data
-        all_sales: List[models.Model] = Sale.objects.all()
-
-        # 累計
-        total_sales: Decimal = sum(
-            sale.total_amount for sale in all_sales if sale.is_active
-        )
-        # UTC+9:00のオフセットを取得
-        jst_offset = timedelta(hours=9)
-
-        # monthly_sales_data の各要素の sale_date を日本時間に変換
-        for sale in all_sales:
-            sale.sale_date = sale.sale_date + jst_offset
-
-        # 月別集計
-        # Filter sales data for the specified conditions
-        monthly_sales_data: List[models.Model] = [
-            sale
-            for sale in all_sales
-            if self.start_date_monthly <= sale.sale_date <= self.end_of_day and sale.is_active
-        ]
-        monthly_data: List[Tuple[Tuple[Any, ...], Dict[str, Union[int, List[Dict[str, Union[str, Decimal, int]]]]]]] = self.format_data(
-            monthly_sales_data
-        )
-        sorted_monthly_data: List[Tuple[Tuple[Any, ...], Dict[str, Union[int, List[Dict[str, Union[str, Decimal, int]]]]]]] = sorted(
-            monthly_data, key=lambda x: x[0], reverse=True
-        )
-
-        # 日別集計
-        daily_sales_data: List[models.Model] = [
-            sale
-            for sale in all_sales
-            if self.start_date_daily <= sale.sale_date <= self.end_of_day and sale.is_active
-        ]
-        daily_data: List[Tuple[Tuple[Any, ...], Dict[str, Union[int, List[Dict[str, Union[str, Decimal, int]]]]]]] = self.format_data(
-            daily_sales_data, is_monthly=False
-        )
-        sorted_daily_data: List[Tuple[Tuple[Any, ...], Dict[str, Union[int, List[Dict[str, Union[str, Decimal, int]]]]]]] = sorted(
-            daily_data, key=lambda x: x[0], reverse=True
-        )
-
-        context = {
-            'total_sales': total_sales,
-            'monthly_data': sorted_monthly_data,
-            'daily_data': sorted_daily_data,
-        }
-
-        return render(request, self.template_name, context)
+        return render(request, self.template_name, self.get_context())
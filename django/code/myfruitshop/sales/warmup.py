@@ -0,0 +1,69 @@
+import logging
+import threading
+import time
+from typing import Callable, List, Tuple
+
+from django.db import connections
+
+from .cache import fruit_catalog
+from .models import Sale
+from .views import SaleCombinedView, SalesAggregateView
+
+
+logger = logging.getLogger(__name__)
+
+# このプロセスでウォームアップが完了したか
+_warmed_up: threading.Event = threading.Event()
+# DBに接続できない場合の再試行間隔（秒）
+RETRY_INTERVAL: float = 5.0
+
+
+def is_warmed_up() -> bool:
+    return _warmed_up.is_set()
+
+
+def _load_sales_list() -> None:
+    # 販売一覧の先頭ページと件数（DB接続とクエリプランの準備）
+    sales = Sale.objects.select_related('fruit').filter(is_active=True).order_by('-sale_date')
+    list(sales[:SaleCombinedView.paginate_by])
+    sales.count()
+
+
+def warmup_steps() -> List[Tuple[str, Callable[[], object]]]:
+    """初回アクセスで発生する処理を、名前と関数の組で返す。"""
+    return [
+        # 果物カタログ（オートコンプリート）
+        ('fruit catalog', fruit_catalog),
+        # 販売統計の集計結果
+        ('sales aggregate', lambda: SalesAggregateView().get_context()),
+        ('sales list', _load_sales_list),
+    ]
+
+
+def run_warmup() -> None:
+    """初回アクセスで発生するキャッシュ・接続の準備を先に済ませる。"""
+    start: float = time.perf_counter()
+    for _, step in warmup_steps():
+        step()
+    _warmed_up.set()
+    logger.info('Warm-up finished in %.3fs', time.perf_counter() - start)
+
+
+def _warmup_until_done() -> None:
+    while not is_warmed_up():
+        try:
+            run_warmup()
+        except Exception:
+            logger.exception('Warm-up failed, retrying in %.0fs', RETRY_INTERVAL)
+            time.sleep(RETRY_INTERVAL)
+        finally:
+            # このスレッドで開いたDB接続を閉じる
+            connections.close_all()
+
+
+def start_warmup() -> threading.Thread:
+    """サーバープロセスの起動時にバックグラウンドでウォームアップを行う。"""
+    thread: threading.Thread = threading.Thread(
+        target=_warmup_until_done, name='warmup', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,35 @@
+// 果物名の前方一致検索で候補を表示し、選択した果物のIDを hidden input に設定する
+document.querySelectorAll('[data-fruit-autocomplete]').forEach(function (input) {
+  var target = document.getElementById(input.dataset.target);
+  var datalist = document.getElementById(input.getAttribute('list'));
+  var results = [];
+  var timer = null;
+
+  function selectByName() {
+    var match = results.find(function (fruit) {
+      return fruit.name === input.value;
+    });
+    target.value = match ? match.id : '';
+  }
+
+  input.addEventListener('input', function () {
+    selectByName();
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+      fetch(input.dataset.fruitAutocomplete + '?q=' + encodeURIComponent(input.value))
+        .then(function (response) {
+          return response.json();
+        })
+        .then(function (data) {
+          results = data.results;
+          datalist.innerHTML = '';
+          results.forEach(function (fruit) {
+            var option = document.createElement('option');
+            option.value = fruit.name;
+            datalist.appendChild(option);
+          });
+          selectByName();
+        });
+    }, 200);
+  });
+});
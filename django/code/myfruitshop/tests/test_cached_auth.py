@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+# テストのキャッシュはプロセス内のLocMemCacheのため、1プロセスの開発サーバーと同じ条件（DEBUG）で確認する
+@override_settings(DEBUG=True)
+class TestCachedAuthentication(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='staff', password='password')
+        self.client.force_login(self.user)
+        self.url = reverse('sales_combined')
+
+    def session_and_auth_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return [
+            query['sql'] for query in queries.captured_queries
+            if 'django_session' in query['sql'] or 'auth_user' in query['sql']
+        ]
+
+    def test_warm_request_issues_no_session_or_auth_queries(self):
+        self.client.get(self.url)
+        self.assertEqual(self.session_and_auth_queries(), [])
+
+    def test_logout_invalidates_cached_user(self):
+        self.client.get(self.url)
+        self.client.post(reverse('logout'))
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_password_change_invalidates_session(self):
+        self.client.get(self.url)
+        self.user.set_password('new-password')
+        self.user.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+
+class TestCachedAuthenticationWithoutSharedCache(TestCase):
+    def test_user_is_loaded_from_database_every_request(self):
+        # DEBUG以外でプロセス内キャッシュしか無い場合は、他のプロセスでのログアウトを見逃さないよう毎回DBを参照する
+        self.client.force_login(User.objects.create_user(username='staff', password='password'))
+        self.client.get(reverse('sales_combined'))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('sales_combined'))
+        self.assertTrue(any('auth_user' in query['sql'] for query in queries.captured_queries))
@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from sales.importers import SaleCsvImporter
+from sales.models import Fruit, Sale
+
+
+class TestFragmentCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='staff', password='password'))
+        self.apple = Fruit.objects.create(name='りんご', price=100)
+        # 当日の集計に含まれる時刻
+        self.sale_date = timezone.localtime().replace(hour=0, minute=30)
+        self.sale = Sale.objects.create(
+            fruit=self.apple, quantity=2, total_amount=200, sale_date=self.sale_date)
+
+    def test_sale_row_is_refreshed_after_update(self):
+        self.assertContains(self.client.get(reverse('sales_combined')), '<td>200</td>')
+
+        self.sale.quantity = 3
+        self.sale.total_amount = 300
+        self.sale.save()
+
+        response = self.client.get(reverse('sales_combined'))
+        self.assertContains(response, '<td>300</td>')
+        self.assertNotContains(response, '<td>200</td>')
+
+    def test_fruit_rename_refreshes_rows(self):
+        self.client.get(reverse('sales_combined'))
+        self.apple.name = 'ふじりんご'
+        self.apple.save()
+        self.assertContains(self.client.get(reverse('sales_combined')), 'ふじりんご')
+
+    def test_aggregate_is_cached_until_sales_change(self):
+        self.assertContains(self.client.get(reverse('sales_aggregate')), 'りんご: 200円 (2)')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('sales_aggregate'))
+        self.assertFalse(any('sales_sale' in query['sql'] for query in queries.captured_queries))
+
+        Sale.objects.create(fruit=self.apple, quantity=1, total_amount=100, sale_date=self.sale_date)
+        self.assertContains(self.client.get(reverse('sales_aggregate')), 'りんご: 300円 (3)')
+
+    def test_aggregate_is_refreshed_after_partially_failed_import(self):
+        self.client.get(reverse('sales_aggregate'))
+
+        def rows():
+            for minute in range(40, 45):
+                yield ['りんご', '1', '100', f'{self.sale_date:%Y-%m-%d} 00:{minute:02d}']
+            # 先頭のチャンクを登録した後に、壊れた圧縮ファイルなどで読み込みに失敗する
+            raise EOFError
+
+        with self.assertRaises(EOFError):
+            SaleCsvImporter('broken.csv', chunk_size=5).import_rows(rows())
+
+        self.assertEqual(Sale.objects.count(), 6)
+        self.assertContains(self.client.get(reverse('sales_aggregate')), 'りんご: 700円 (7)')
@@ -0,0 +1,128 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from sales import group_commit
+from sales.group_commit import SaleCommitBuffer, SaleCommitTimeout
+from sales.models import Fruit, Sale
+
+
+class TestSaleCommitBuffer(TransactionTestCase):
+    def setUp(self):
+        self.apple = Fruit.objects.create(name='りんご', price=100)
+
+    def sale(self, quantity=1):
+        return Sale(fruit=self.apple, quantity=quantity, total_amount=quantity * 100, sale_date=timezone.now())
+
+    def test_concurrent_sales_are_committed_together(self):
+        buffer = SaleCommitBuffer(max_rows=10, max_delay_ms=200, submit_timeout=10)
+        barrier = threading.Barrier(10)
+
+        def client():
+            barrier.wait()
+            buffer.submit(self.sale())
+            connection.close()
+
+        with mock.patch.object(Sale.objects, 'bulk_create', wraps=Sale.objects.bulk_create) as bulk_create:
+            threads = [threading.Thread(target=client) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # submitから戻った時点でコミット済みであること
+        self.assertEqual(Sale.objects.count(), 10)
+        self.assertLess(bulk_create.call_count, 10)
+
+    def test_committed_sales_have_pk_and_send_post_save(self):
+        buffer = SaleCommitBuffer(max_rows=10, max_delay_ms=5, submit_timeout=10)
+        received = []
+
+        def receiver(sender, instance, created, **kwargs):
+            received.append((instance.pk, created))
+
+        post_save.connect(receiver, sender=Sale)
+        self.addCleanup(post_save.disconnect, receiver, sender=Sale)
+        # MySQLと同じく、bulk_createが主キーを返さないDBでも読み戻すこと
+        features = type(connection.features)
+        with mock.patch.object(features, 'can_return_rows_from_bulk_insert', False):
+            sale = buffer.submit(self.sale())
+
+        self.assertEqual(sale.pk, Sale.objects.get().pk)
+        self.assertEqual(received, [(sale.pk, True)])
+        # 読み戻しに使った値は残さず、CSV取込のフィンガープリントも使わない
+        self.assertEqual(Sale.objects.values_list('import_fingerprint', 'insert_token').get(), (None, None))
+
+    def test_timed_out_sale_is_not_committed_later(self):
+        buffer = SaleCommitBuffer(max_rows=10, max_delay_ms=300, submit_timeout=0.05)
+        with self.assertRaises(SaleCommitTimeout):
+            buffer.submit(self.sale(quantity=1))
+
+        # 同じバッチで後からコミットされる販売があっても、取り消した販売は登録されない
+        buffer.submit_timeout = 10
+        buffer.submit(self.sale(quantity=2))
+        self.assertEqual(list(Sale.objects.values_list('quantity', flat=True)), [2])
+
+    def test_invalid_sale_does_not_fail_others(self):
+        buffer = SaleCommitBuffer(max_rows=2, max_delay_ms=200, submit_timeout=10)
+        invalid = self.sale()
+        invalid.fruit_id = 999999
+        results = {}
+
+        def client(name, sale):
+            try:
+                results[name] = buffer.submit(sale)
+            except Exception as error:
+                results[name] = error
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=client, args=('valid', self.sale())),
+            threading.Thread(target=client, args=('invalid', invalid)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIsInstance(results['valid'], Sale)
+        self.assertIsInstance(results['invalid'], Exception)
+        self.assertEqual(Sale.objects.count(), 1)
+
+    @override_settings(SALES_GROUP_COMMIT={'ENABLED': True, 'MAX_ROWS': 10, 'MAX_DELAY_MS': 5})
+    def test_add_sale_view_waits_for_commit(self):
+        self.addCleanup(setattr, group_commit, '_buffer', None)
+        self.client.force_login(User.objects.create_user(username='staff', password='password'))
+
+        response = self.client.post(reverse('add_sales'), {
+            'fruit': self.apple.pk,
+            'quantity': 3,
+            'sale_date': '2024-01-20 10:00',
+        })
+
+        self.assertRedirects(response, reverse('sales_combined'))
+        self.assertEqual(Sale.objects.get().total_amount, 300)
+
+    def test_add_sale_view_shows_timeout_and_keeps_input(self):
+        self.client.force_login(User.objects.create_user(username='staff', password='password'))
+
+        with mock.patch('sales.views.save_sale', side_effect=SaleCommitTimeout):
+            response = self.client.post(reverse('add_sales'), {
+                'fruit': self.apple.pk,
+                'quantity': 3,
+                'sale_date': '2024-01-20T10:00',
+            })
+
+        # 登録されなかったことを表示し、入力した値を残して再送できるようにする
+        self.assertContains(response, '混雑のため登録できませんでした。')
+        self.assertContains(response, 'value="りんご"')
+        self.assertContains(response, 'value="3"')
+        self.assertContains(response, 'value="2024-01-20T10:00"')
+        self.assertFalse(Sale.objects.exists())
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from sales.importers import SaleCsvImporter
+from sales.models import Fruit, FruitPriceHistory, Sale
+from sales.pricing import PriceIndex
+
+JST = timezone(timedelta(hours=9))
+
+
+class TestPriceIndex(TestCase):
+    def test_price_at_uses_interval_containing_date(self):
+        index = PriceIndex.from_rows([
+            (1, datetime(2024, 1, 1, tzinfo=JST), 100, False),
+            (1, datetime(2024, 2, 1, tzinfo=JST), 120, False),
+        ])
+        self.assertEqual(index.price_at(1, datetime(2023, 12, 31, tzinfo=JST)), 100)
+        self.assertEqual(index.price_at(1, datetime(2024, 1, 31, 23, 59, tzinfo=JST)), 100)
+        self.assertEqual(index.price_at(1, datetime(2024, 2, 1, tzinfo=JST)), 120)
+        self.assertIsNone(index.price_at(2, datetime(2024, 2, 1, tzinfo=JST)))
+
+    def test_recorded_price_excludes_seeded_history(self):
+        index = PriceIndex.from_rows([
+            (1, datetime(2024, 1, 1, tzinfo=JST), 100, True),
+            (1, datetime(2024, 2, 1, tzinfo=JST), 120, False),
+        ])
+        self.assertEqual(index.price_at(1, datetime(2024, 1, 15, tzinfo=JST)), 100)
+        self.assertIsNone(index.recorded_price_at(1, datetime(2024, 1, 15, tzinfo=JST)))
+        self.assertIsNone(index.recorded_price_at(1, datetime(2023, 12, 1, tzinfo=JST)))
+        self.assertEqual(index.recorded_price_at(1, datetime(2024, 2, 15, tzinfo=JST)), 120)
+
+
+class TestFruitPriceHistory(TestCase):
+    def setUp(self):
+        self.apple = Fruit.objects.create(name='りんご', price=100)
+        # 1月1日から100円、2月1日から120円
+        FruitPriceHistory.objects.filter(fruit=self.apple).update(
+            valid_from=datetime(2024, 1, 1, tzinfo=JST))
+        self.apple = Fruit.objects.get(pk=self.apple.pk)
+        self.apple.price = 120
+        self.apple.save()
+        FruitPriceHistory.objects.filter(fruit=self.apple, price=120).update(
+            valid_from=datetime(2024, 2, 1, tzinfo=JST))
+
+    def test_history_is_written_only_when_price_changes(self):
+        self.apple.name = 'ふじりんご'
+        self.apple.save()
+        prices = list(FruitPriceHistory.objects.filter(fruit=self.apple)
+                      .order_by('valid_from').values_list('price', flat=True))
+        self.assertEqual(prices, [100, 120])
+
+    def test_import_validates_against_price_at_sale_date(self):
+        rows = [
+            ['りんご', '2', '200', '2024-01-20 10:00'],  # 1月の単価
+            ['りんご', '2', '240', '2024-02-20 10:00'],  # 2月の単価
+            ['りんご', '2', '240', '2024-01-20 11:00'],  # 1月に2月の単価は不可
+        ]
+        result = SaleCsvImporter('backfill.csv').import_rows(rows)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.invalid, 1)
+
+    def test_history_lookup_does_not_query_per_row(self):
+        rows = [['りんご', '1', '100', f'2024-01-{day:02d} 10:00'] for day in range(1, 29)]
+        with CaptureQueriesContext(connection) as queries:
+            SaleCsvImporter('backfill.csv').import_rows(rows)
+        history_queries = [
+            query for query in queries.captured_queries if 'sales_fruitpricehistory' in query['sql']
+        ]
+        self.assertEqual(len(history_queries), 1)
+        self.assertEqual(Sale.objects.count(), 28)
+
+    def test_backdated_sale_uses_price_at_sale_date(self):
+        self.client.force_login(User.objects.create_user(username='staff', password='password'))
+        # 単価の変更後に、1月の販売を登録・編集する
+        self.client.post(reverse('add_sales'), {
+            'fruit': self.apple.pk, 'quantity': 2, 'sale_date': '2024-01-20 10:00'})
+        sale = Sale.objects.get()
+        self.assertEqual(sale.total_amount, 200)
+
+        self.client.post(reverse('edit_sales', args=[sale.pk]), {
+            'fruit': self.apple.pk, 'quantity': 3, 'sale_date': '2024-01-21 10:00'})
+        sale.refresh_from_db()
+        self.assertEqual(sale.total_amount, 300)
+
+        self.client.post(reverse('edit_sales', args=[sale.pk]), {
+            'fruit': self.apple.pk, 'quantity': 3, 'sale_date': '2024-02-21 10:00'})
+        sale.refresh_from_db()
+        self.assertEqual(sale.total_amount, 360)
+
+    def test_price_at(self):
+        self.assertEqual(self.apple.price_at(datetime(2024, 1, 15, tzinfo=JST)), 100)
+        self.assertEqual(self.apple.price_at(datetime(2024, 3, 1, tzinfo=JST)), 120)
+
+
+class TestFruitPriceHistoryAdmin(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password'))
+        self.apple = Fruit.objects.create(name='りんご', price=120)
+
+    def test_backfill_is_validated_against_historical_price(self):
+        # 導入前の期間（2023年）の単価を過去の日付から登録する
+        response = self.client.post(reverse('admin:sales_fruitpricehistory_add'), {
+            'fruit': self.apple.pk,
+            'price': 100,
+            'valid_from_0': '2023-01-01',
+            'valid_from_1': '00:00:00',
+        })
+        self.assertEqual(response.status_code, 302)
+
+        result = SaleCsvImporter('backfill_2023.csv').import_rows([
+            ['りんご', '2', '200', '2023-06-01 10:00'],
+            ['りんご', '2', '240', '2023-06-01 11:00'],
+        ])
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.invalid, 1)
+
+    def test_changelist_and_fruit_inline(self):
+        response = self.client.get(reverse('admin:sales_fruitpricehistory_changelist'))
+        self.assertContains(response, 'りんご')
+        response = self.client.get(reverse('admin:sales_fruit_change', args=[self.apple.pk]))
+        self.assertContains(response, 'price_history-0-valid_from')
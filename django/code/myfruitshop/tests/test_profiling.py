@@ -0,0 +1,62 @@
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from myfruitshop.profiling import ProfileStore
+
+
+class TestProfilingMiddleware(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.store = ProfileStore(self.directory, 3)
+        self.staff = User.objects.create_user(
+            username='staff', password='password', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='password')
+
+    def profiling(self, **options):
+        return override_settings(PROFILING={
+            'ENABLED': True, 'DIRECTORY': self.directory, 'MAX_PROFILES': 3, **options,
+        })
+
+    def test_disabled_by_default(self):
+        self.client.force_login(self.staff)
+        with override_settings(PROFILING={'ENABLED': False, 'DIRECTORY': self.directory}):
+            self.client.get(reverse('top'), {'profile': '1'})
+        self.assertEqual(self.store.names(), [])
+
+    def test_staff_request_is_profiled(self):
+        self.client.force_login(self.staff)
+        with self.profiling():
+            response = self.client.get(reverse('sales_combined'), {'profile': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        names = self.store.names()
+        self.assertEqual(len(names), 1)
+        profile = self.store.load(names[0])
+        self.assertGreater(profile['query_count'], 0)
+        self.assertTrue(self.store.top_functions(names[0]))
+
+    def test_non_staff_cannot_trigger(self):
+        self.client.force_login(self.user)
+        with self.profiling():
+            self.client.get(reverse('top'), HTTP_X_PROFILE='1')
+        self.assertEqual(self.store.names(), [])
+
+    def test_sampling_and_ring_size(self):
+        self.client.force_login(self.user)
+        with self.profiling(SAMPLE_RATE=1):
+            for _ in range(5):
+                self.client.get(reverse('top'))
+        # 保存件数は MAX_PROFILES を超えない
+        self.assertEqual(len(self.store.names()), 3)
+
+    def test_admin_page_lists_profiles(self):
+        self.client.force_login(self.staff)
+        with self.profiling(SAMPLE_RATE=1):
+            self.client.get(reverse('top'))
+            response = self.client.get(reverse('profiles'))
+        self.assertContains(response, '/top/')
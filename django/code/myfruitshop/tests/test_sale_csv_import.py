@@ -0,0 +1,171 @@
+import gzip
+import io
+import zipfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from sales.csv_parsing import iter_line_chunks
+from sales.importers import SaleCsvImporter
+from sales.models import Fruit, Sale
+
+
+class TestSaleCsvImport(TestCase):
+    def setUp(self):
+        self.apple = Fruit.objects.create(name='りんご', price=100)
+        self.rows = [
+            ['りんご', '2', '200', '2024-01-20 10:00'],
+            ['りんご', '3', '300', '2024-01-20 11:00'],
+        ]
+
+    def test_reimport_skips_existing_rows(self):
+        first = SaleCsvImporter('sales_0120.csv').import_rows(self.rows)
+        self.assertEqual(first.created, 2)
+        self.assertEqual(first.duplicates, 0)
+
+        # 同じファイルを再アップロードしても重複登録されない
+        second = SaleCsvImporter('sales_0120.csv').import_rows(self.rows)
+        self.assertEqual(second.created, 0)
+        self.assertEqual(second.duplicates, 2)
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_rows_imported_concurrently_are_not_inserted_twice(self):
+        # 同時に取り込まれた同じ行は一意制約で登録されず、重複として数えられる
+        SaleCsvImporter('sales_0120.csv').import_rows(self.rows[:1])
+        result = SaleCsvImporter('sales_0120.csv').import_rows(self.rows)
+        self.assertEqual((result.created, result.duplicates), (1, 1))
+        self.assertFalse(Sale.objects.exclude(insert_token=None).exists())
+
+        sale = Sale.objects.first()
+        sale.pk = None
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            sale.save()
+
+    def test_identical_rows_in_one_file_are_separate_sales(self):
+        # 別々のレジで同じ時刻に同じ販売があった場合
+        rows = self.rows + [self.rows[0]]
+        first = SaleCsvImporter('sales_0120.csv').import_rows(rows)
+        self.assertEqual(first.created, 3)
+        self.assertEqual(first.duplicates, 0)
+
+        second = SaleCsvImporter('sales_0120.csv').import_rows(rows)
+        self.assertEqual(second.created, 0)
+        self.assertEqual(second.duplicates, 3)
+
+    def test_occurrences_are_counted_within_window(self):
+        rows = self.rows + [self.rows[0]]
+        # 直近の2種類の行の中で同じ内容が現れた場合は別の販売
+        within = SaleCsvImporter('within.csv', occurrence_window=2).import_rows(rows)
+        self.assertEqual((within.created, within.duplicates), (3, 0))
+
+        # 範囲より離れて現れた同じ内容の行は、取込済みの行とみなされる
+        outside = SaleCsvImporter('outside.csv', occurrence_window=1).import_rows(rows)
+        self.assertEqual((outside.created, outside.duplicates), (2, 1))
+
+    def test_invalid_rows_are_counted(self):
+        rows = self.rows + [
+            ['りんご', '2', '999', '2024-01-20 12:00'],  # 金額不一致
+            ['りんご', '2', '200', '2024/01/20 12:00'],  # 日付形式不正
+            ['みかん', '1', '50', '2024-01-20 12:00'],   # 未登録の果物
+        ]
+        result = SaleCsvImporter('sales_0120.csv').import_rows(rows)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.invalid, 3)
+
+    def test_duplicate_lookup_is_batched_per_chunk(self):
+        rows = [
+            ['りんご', '1', '100', f'2024-01-20 10:{minute:02d}'] for minute in range(50)
+        ]
+        importer = SaleCsvImporter('sales_0120.csv', chunk_size=25)
+        with CaptureQueriesContext(connection) as queries:
+            importer.import_rows(rows)
+
+        # チャンクごとにbulk_create 1回 + 登録した行の読み戻し1回 + トークンの消去1回
+        statements = [query['sql'].split()[0] for query in queries.captured_queries]
+        self.assertEqual(statements.count('INSERT'), 2)
+        self.assertEqual(statements.count('SELECT'), 2)
+        self.assertEqual(statements.count('UPDATE'), 2)
+        self.assertEqual(Sale.objects.count(), 50)
+
+    def test_upload_reports_skipped_duplicates(self):
+        user = User.objects.create_user(username='staff', password='password')
+        self.client.force_login(user)
+        content = '\n'.join(','.join(row) for row in self.rows).encode('utf-8')
+
+        for _ in range(2):
+            response = self.client.post(
+                reverse('sales_combined'),
+                {'csv_file': SimpleUploadedFile('sales_0120.csv', content)},
+            )
+
+        self.assertContains(response, '重複スキップ: 2件')
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_upload_compressed_files(self):
+        user = User.objects.create_user(username='staff', password='password')
+        self.client.force_login(user)
+        content = '\n'.join(','.join(row) for row in self.rows).encode('utf-8')
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as f:
+            f.writestr('sales.csv', content)
+
+        uploads = [
+            SimpleUploadedFile('sales_0120.csv.gz', gzip.compress(content)),
+            SimpleUploadedFile('sales_0120.zip', archive.getvalue()),
+        ]
+        for upload in uploads:
+            self.client.post(reverse('sales_combined'), {'csv_file': upload})
+
+        # ファイル名が異なるため、それぞれ別の取込として登録される
+        self.assertEqual(Sale.objects.count(), 4)
+
+    def test_parallel_parse_keeps_order_and_counts(self):
+        lines = [
+            f'りんご,{quantity},{quantity * 100},2024-01-20 10:00\n' for quantity in range(1, 101)
+        ] + ['broken line\n']
+        importer = SaleCsvImporter('backfill.csv', chunk_size=30)
+
+        result = importer.import_stream(io.StringIO(''.join(lines)), workers=2, chunk_lines=25)
+
+        self.assertEqual(result.created, 100)
+        self.assertEqual(result.invalid, 1)
+        quantities = list(Sale.objects.order_by('pk').values_list('quantity', flat=True))
+        self.assertEqual(quantities, list(range(1, 101)))
+
+    def test_parallel_parse_does_not_split_multiline_records(self):
+        content = (
+            'りんご,1,100,2024-01-20 10:00\n'
+            '"りんご\nジュース",1,100,2024-01-20 10:01\n'
+            'りんご,2,200,2024-01-20 10:02\n'
+        )
+        inline = SaleCsvImporter('inline.csv').import_stream(io.StringIO(content))
+        parallel = SaleCsvImporter('parallel.csv').import_stream(io.StringIO(content), workers=2, chunk_lines=2)
+
+        # 改行を含む値は1行として扱われ、解析方法によらず結果が同じになる
+        self.assertEqual((inline.created, inline.invalid), (2, 1))
+        self.assertEqual((parallel.created, parallel.invalid), (2, 1))
+
+    def test_quote_inside_value_does_not_merge_following_chunks(self):
+        # 値の途中の引用符は引用の開始ではないため、以降の行も通常どおりチャンクに分かれる
+        content = 'りんご 5" 箱,1,100,2024-01-20 10:00\n' + ''.join(
+            f'りんご,1,100,2024-01-20 10:{minute:02d}\n' for minute in range(1, 10))
+
+        chunks = list(iter_line_chunks(io.StringIO(content), chunk_lines=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 2, 2, 2])
+
+        inline = SaleCsvImporter('inline.csv').import_stream(io.StringIO(content))
+        parallel = SaleCsvImporter('parallel.csv').import_stream(io.StringIO(content), workers=2, chunk_lines=2)
+        self.assertEqual((inline.created, inline.invalid), (9, 1))
+        self.assertEqual((parallel.created, parallel.invalid), (9, 1))
+
+    def test_unclosed_quote_does_not_hold_rest_of_file(self):
+        content = '"りんご,1,100,2024-01-20 10:00\n' + 'りんご,1,100,2024-01-20 10:01\n' * 9
+
+        chunks = list(iter_line_chunks(io.StringIO(content), chunk_lines=2))
+        self.assertTrue(all(len(chunk) <= 4 for chunk in chunks))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 10)
@@ -0,0 +1,69 @@
+from datetime import date, datetime, timezone
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from freezegun import freeze_time
+
+from sales.importers import SaleCsvImporter
+from sales.models import Fruit, Sale
+from sales.views import SalesAggregateView
+
+
+class TestSaleLocalCalendar(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.apple = Fruit.objects.create(name='りんご', price=100)
+
+    def create_sale(self, sale_date, quantity=1):
+        return Sale.objects.create(
+            fruit=self.apple, quantity=quantity, total_amount=quantity * 100, sale_date=sale_date)
+
+    def test_keys_use_japan_time(self):
+        # UTCの1月31日16:30は日本時間の2月1日1:30
+        sale = self.create_sale(datetime(2024, 1, 31, 16, 30, tzinfo=timezone.utc))
+        self.assertEqual(sale.sale_local_date, date(2024, 2, 1))
+        self.assertEqual(sale.sale_year_month, 202402)
+
+        sale.sale_date = datetime(2024, 1, 31, 14, 0, tzinfo=timezone.utc)
+        sale.save(update_fields=['sale_date'])
+        sale.refresh_from_db()
+        self.assertEqual((sale.sale_local_date, sale.sale_year_month), (date(2024, 1, 31), 202401))
+
+    def test_bulk_import_sets_keys(self):
+        SaleCsvImporter('sales.csv').import_rows([['りんご', '1', '100', '2024-02-01 01:30']])
+        sale = Sale.objects.get()
+        self.assertEqual((sale.sale_local_date, sale.sale_year_month), (date(2024, 2, 1), 202402))
+
+    @freeze_time('2024-02-01 03:00:00')
+    def test_aggregate_buckets_by_local_date(self):
+        self.create_sale(datetime(2024, 1, 31, 16, 30, tzinfo=timezone.utc), quantity=2)  # 2月1日
+        self.create_sale(datetime(2024, 1, 31, 14, 0, tzinfo=timezone.utc), quantity=3)  # 1月31日
+        self.create_sale(datetime(2023, 11, 30, 16, 0, tzinfo=timezone.utc), quantity=4)  # 12月1日
+        self.create_sale(datetime(2023, 11, 30, 14, 0, tzinfo=timezone.utc), quantity=5)  # 11月30日（対象外）
+        self.create_sale(datetime(2024, 2, 2, 0, 0, tzinfo=timezone.utc), quantity=6)  # 2月2日（明日以降は対象外）
+
+        context = SalesAggregateView().aggregate()
+
+        self.assertEqual(context['total_sales'], 2000)
+        self.assertEqual(
+            [(row['label'], row['total']) for row in context['monthly_data']],
+            [('2024/2', 200), ('2024/1', 300), ('2023/12', 400)],
+        )
+        self.assertEqual(
+            [(row['label'], row['breakdown']) for row in context['daily_data']],
+            [('2024/2/1', 'りんご: 200円 (2)'), ('2024/1/31', 'りんご: 300円 (3)')],
+        )
+
+    def test_admin_date_hierarchy_filters_by_local_date(self):
+        self.client.force_login(User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password'))
+        february = self.create_sale(datetime(2024, 1, 31, 16, 30, tzinfo=timezone.utc))
+        self.create_sale(datetime(2024, 1, 31, 14, 0, tzinfo=timezone.utc))
+
+        response = self.client.get(reverse('admin:sales_sale_changelist'), {
+            'sale_local_date__year': 2024, 'sale_local_date__month': 2, 'sale_local_date__day': 1,
+        })
+
+        self.assertEqual([sale.pk for sale in response.context['cl'].result_list], [february.pk])
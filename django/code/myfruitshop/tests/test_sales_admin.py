@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.admin import helpers
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from sales.models import Fruit, Sale
+
+
+class TestSaleAdmin(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password')
+        self.client.force_login(self.admin_user)
+        # ログインユーザーのキャッシュを温め、計測対象を一覧の描画に限定する
+        self.client.get(reverse('admin:index'))
+        self.fruits = [
+            Fruit.objects.create(name=f'fruit{i}', price=100) for i in range(5)
+        ]
+
+    def create_sales(self, count):
+        base = datetime(2024, 1, 20, 12, 0, tzinfo=timezone.utc)
+        Sale.objects.bulk_create([
+            Sale(
+                fruit=self.fruits[i % len(self.fruits)],
+                quantity=1,
+                total_amount=100,
+                sale_date=base - timedelta(hours=i),
+            )
+            for i in range(count)
+        ])
+
+    def count_changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:sales_sale_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_is_bounded(self):
+        self.create_sales(5)
+        few_rows = self.count_changelist_queries()
+
+        self.create_sales(80)
+        many_rows = self.count_changelist_queries()
+
+        # 行数が増えてもfruitの取得でクエリが増えないこと
+        self.assertEqual(few_rows, many_rows)
+        self.assertLessEqual(many_rows, 10)
+
+    def test_soft_delete_and_restore_actions(self):
+        self.create_sales(3)
+        pks = list(Sale.objects.values_list('pk', flat=True))
+        url = reverse('admin:sales_sale_changelist')
+
+        self.client.post(url, {'action': 'soft_delete', helpers.ACTION_CHECKBOX_NAME: pks})
+        self.assertEqual(Sale.objects.filter(is_active=False).count(), 3)
+
+        self.client.post(url, {'action': 'restore', helpers.ACTION_CHECKBOX_NAME: pks})
+        self.assertEqual(Sale.objects.filter(is_active=True).count(), 3)
@@ -0,0 +1,149 @@
+import csv
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone as django_timezone
+
+from sales.audit import iter_id_ranges
+from sales.models import Fruit, FruitPriceHistory, Sale
+from sales.views import SalesAggregateView
+
+JST = timezone(timedelta(hours=9))
+
+
+class TestAuditSales(TestCase):
+    def setUp(self):
+        self.apple = Fruit.objects.create(name='りんご', price=100)
+        # 1月1日から100円、2月1日から120円
+        FruitPriceHistory.objects.filter(fruit=self.apple).update(valid_from=datetime(2024, 1, 1, tzinfo=JST))
+        self.apple.price = 120
+        self.apple.save()
+        FruitPriceHistory.objects.filter(fruit=self.apple, price=120).update(
+            valid_from=datetime(2024, 2, 1, tzinfo=JST))
+
+        self.valid = [
+            self.create_sale(2, 200, datetime(2024, 1, 20, tzinfo=JST)),
+            self.create_sale(2, 240, datetime(2024, 2, 20, tzinfo=JST)),
+        ]
+        # 1月の販売に2月の単価で計算した金額
+        self.wrong = self.create_sale(2, 240, datetime(2024, 1, 21, tzinfo=JST))
+        # 削除済みの販売は検証しない
+        self.create_sale(1, 1, datetime(2024, 1, 22, tzinfo=JST), is_active=False)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.report = os.path.join(directory.name, 'audit.csv')
+
+    def create_sale(self, quantity, total_amount, sale_date, is_active=True):
+        return Sale.objects.create(fruit=self.apple, quantity=quantity, total_amount=total_amount,
+                                   sale_date=sale_date, is_active=is_active)
+
+    def audit(self, *args):
+        call_command('audit_sales', '--report', self.report, '--workers', '1', '--range-size', '2',
+                     *args, stdout=StringIO(), stderr=StringIO())
+
+    def read_report(self):
+        with open(self.report, newline='', encoding='utf-8') as report:
+            return list(csv.reader(report))[1:]
+
+    def test_reports_mismatched_totals(self):
+        with self.assertRaises(CommandError):
+            self.audit()
+        self.assertEqual(self.read_report(), [[str(self.wrong.pk), 'total_amount', '240', '200', 'True']])
+
+    def test_fix_updates_mismatched_totals(self):
+        self.audit('--fix')
+
+        self.wrong.refresh_from_db()
+        self.assertEqual(self.wrong.total_amount, 200)
+        for sale in self.valid:
+            self.assertEqual(Sale.objects.get(pk=sale.pk).total_amount, sale.total_amount)
+        # 修正後は不整合がないこと
+        self.audit()
+        self.assertEqual(self.read_report(), [])
+
+    def test_id_ranges_cover_all_ids(self):
+        self.assertEqual(list(iter_id_ranges(1, 5, 2)), [(1, 3), (3, 5), (5, 6)])
+
+    def test_sales_before_recorded_history_are_reported_not_fixed(self):
+        # 価格履歴の導入時の推定（登録日時から現在の単価）で比べた販売は書き換えない
+        FruitPriceHistory.objects.filter(fruit=self.apple, price=100).update(is_seeded=True)
+
+        # 正しい単価が分からない販売は報告のみで、監査の失敗にはしない
+        self.audit('--fix')
+        self.wrong.refresh_from_db()
+        self.assertEqual(self.wrong.total_amount, 240)
+        self.assertEqual(self.read_report()[0][-1], 'False')
+
+    def test_consistent_sales_pass(self):
+        self.wrong.delete()
+        # 販売統計画面の集計期間内の販売も行の合計と一致すること
+        self.create_sale(1, 120, django_timezone.now())
+
+        self.audit()
+        self.assertEqual(self.read_report(), [])
+
+    def test_reports_and_fixes_mismatched_local_dates(self):
+        self.wrong.delete()
+        sale = self.create_sale(1, 120, django_timezone.now())
+        # 日付の列だけが販売日時とずれている（画面の日別集計は別の日に計上される）
+        previous_day = django_timezone.localdate() - timedelta(days=1)
+        Sale.objects.filter(pk=sale.pk).update(sale_local_date=previous_day)
+
+        with self.assertRaises(CommandError):
+            self.audit()
+        report = self.read_report()
+        self.assertEqual(report[0][:2], [str(sale.pk), 'local_calendar'])
+        self.assertEqual(report[0][-1], 'True')
+        # 行から求めた日別集計と、画面の日別集計の両方の日付で不一致となる
+        self.assertEqual([row[1].split()[0] for row in report[1:]], ['daily', 'daily'])
+        self.assertTrue(all(row[0] == '' and row[-1] == 'False' for row in report[1:]))
+
+        # 修正前の画面の集計値と比べるため、修正した回も集計の不一致は報告される
+        with self.assertRaises(CommandError):
+            self.audit('--fix')
+        sale.refresh_from_db()
+        self.assertEqual(sale.sale_local_date, django_timezone.localdate(sale.sale_date))
+        self.audit()
+        self.assertEqual(self.read_report(), [])
+
+    def audit_with_concurrent_change(self, before_served=None, after_served=None):
+        # 販売IDの範囲を決めてから行を検証するまでの間に、別のリクエストが販売を登録・更新する
+        aggregate_buckets = SalesAggregateView.aggregate_buckets
+
+        def served_with_changes(view, *args, **kwargs):
+            if before_served:
+                before_served()
+            served = aggregate_buckets(view, *args, **kwargs)
+            if after_served:
+                after_served()
+            return served
+
+        stderr = StringIO()
+        with mock.patch.object(SalesAggregateView, 'aggregate_buckets', served_with_changes):
+            call_command('audit_sales', '--report', self.report, '--workers', '1', '--range-size', '2',
+                         stdout=StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def test_sales_added_during_audit_are_not_compared(self):
+        self.wrong.delete()
+        self.audit_with_concurrent_change(before_served=lambda: self.create_sale(1, 120, django_timezone.now()))
+        self.assertEqual(self.read_report(), [])
+
+    def test_sales_changed_during_audit_do_not_fail(self):
+        self.wrong.delete()
+        sale = self.create_sale(1, 120, django_timezone.now())
+
+        def soft_delete():
+            sale.is_active = False
+            sale.save()
+
+        # 削除された販売は画面の集計値にだけ含まれるが、監査中の更新のため失敗にはしない
+        stderr = self.audit_with_concurrent_change(after_served=soft_delete)
+        self.assertIn('1 sales changed during the audit', stderr)
+        self.assertTrue(all(row[0] == '' for row in self.read_report()))
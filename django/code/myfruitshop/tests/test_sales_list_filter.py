@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from sales.models import Fruit, Sale
+
+
+class TestSalesListFilter(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='staff', password='password'))
+        self.apple = Fruit.objects.create(name='りんご', price=100)
+        self.banana = Fruit.objects.create(name='バナナ', price=50)
+        jst = timezone(timedelta(hours=9))
+        Sale.objects.create(fruit=self.apple, quantity=1, total_amount=100,
+                            sale_date=datetime(2024, 1, 10, 12, 0, tzinfo=jst))
+        Sale.objects.create(fruit=self.apple, quantity=5, total_amount=500,
+                            sale_date=datetime(2024, 1, 20, 23, 30, tzinfo=jst))
+        Sale.objects.create(fruit=self.banana, quantity=2, total_amount=100,
+                            sale_date=datetime(2024, 1, 20, 9, 0, tzinfo=jst))
+
+    def get_sales(self, **params):
+        response = self.client.get(reverse('sales_combined'), params)
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['sales'])
+
+    def test_filter_by_fruit(self):
+        sales = self.get_sales(fruit=self.banana.pk)
+        self.assertEqual([sale.fruit for sale in sales], [self.banana])
+
+    def test_filter_by_date_range_includes_end_date(self):
+        sales = self.get_sales(date_from='2024-01-20', date_to='2024-01-20')
+        self.assertEqual(len(sales), 2)
+
+    def test_filter_by_amount_range(self):
+        sales = self.get_sales(amount_min=200, amount_max=1000)
+        self.assertEqual([sale.total_amount for sale in sales], [500])
+
+    def test_pagination_keeps_filters(self):
+        response = self.client.get(reverse('sales_combined'), {'fruit': self.apple.pk, 'page': 1})
+        self.assertEqual(response.context['querystring'], f'fruit={self.apple.pk}')
+
+
+class TestFruitAutocomplete(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='staff', password='password'))
+        Fruit.objects.create(name='みかん', price=30)
+        Fruit.objects.create(name='みず菜', price=80)
+        Fruit.objects.create(name='メロン', price=1000)
+        Fruit.objects.create(name='みつば', price=60, is_active=False)
+
+    def test_prefix_search_returns_active_fruits(self):
+        response = self.client.get(reverse('fruit_autocomplete'), {'q': 'み'})
+        names = [fruit['name'] for fruit in response.json()['results']]
+        self.assertEqual(names, ['みかん', 'みず菜'])
+
+    def test_add_sale_page_does_not_render_fruit_select(self):
+        response = self.client.get(reverse('add_sales'))
+        self.assertNotContains(response, 'メロン')
@@ -0,0 +1,61 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from sales import warmup
+from sales.models import Fruit
+
+
+class TestWarmup(TestCase):
+    def setUp(self):
+        cache.clear()
+        # 他のテストの影響を受けないよう、ウォームアップ前の状態に戻す
+        warmup._warmed_up.clear()
+        self.addCleanup(warmup._warmed_up.clear)
+        Fruit.objects.create(name='りんご', price=100)
+        Fruit.objects.create(name='りんごジュース', price=300)
+        Fruit.objects.create(name='みかん', price=80)
+
+    def test_not_ready_until_warmed_up(self):
+        response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'status': 'warming_up'})
+
+        warmup.run_warmup()
+
+        response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ready'})
+
+    def test_autocomplete_is_served_from_warmed_catalog(self):
+        warmup.run_warmup()
+        self.client.force_login(User.objects.create_user(username='staff', password='password'))
+        self.client.get(reverse('top'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('fruit_autocomplete'), {'q': 'りんご'})
+        names = [fruit['name'] for fruit in response.json()['results']]
+        self.assertEqual(names, ['りんご', 'りんごジュース'])
+        self.assertFalse(any('sales_fruit' in query['sql'] for query in queries.captured_queries))
+
+    def test_catalog_is_refreshed_after_fruit_change(self):
+        warmup.run_warmup()
+        self.client.force_login(User.objects.create_user(username='staff', password='password'))
+        Fruit.objects.create(name='りんご飴', price=200)
+
+        response = self.client.get(reverse('fruit_autocomplete'), {'q': 'りんご'})
+        names = [fruit['name'] for fruit in response.json()['results']]
+        self.assertEqual(names, ['りんご', 'りんごジュース', 'りんご飴'])
+
+    def test_db_precheck_does_not_mark_server_ready(self):
+        stdout = StringIO()
+        call_command('db_precheck', stdout=stdout)
+
+        self.assertIn('Database pre-check passed', stdout.getvalue())
+        self.assertFalse(warmup.is_warmed_up())